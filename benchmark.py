@@ -0,0 +1,548 @@
+"""Load-test harness for bot.py.
+
+Stands up a local fake of the Instagram ``live/*`` private endpoints and
+drives the real bot handlers with fake Telegram updates, reporting handler
+latency percentiles, throughput and memory.
+
+    python benchmark.py handlers --operators 100 --duration 10
+    python benchmark.py handlers --operators 100 --async-http --throttle 0.02
+    python benchmark.py handlers --operators 100 --dashboard
+    python benchmark.py webhook --url http://127.0.0.1:8443/telegram --updates 1000
+    python benchmark.py moderation --keywords 50000 --comments 100000
+    python benchmark.py startup --runs 10
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+
+class FakeInstagram:
+    """Minimal HTTP/1.1 server emulating the live endpoints used by InstagramLive.
+
+    Runs its own event loop in a background thread so its simulated latency
+    never competes with the bot's loop.
+    """
+
+    def __init__(self, latency=0.05, comment_rate=10.0, viewers=200, throttle=0.0):
+        self.latency = latency
+        self.comment_rate = comment_rate
+        self.viewers = viewers
+        self.throttle = throttle
+        self.requests = 0
+        self.unauthorized = 0
+        self.port = None
+        self._ids = itertools.count(17000000000000000)
+        self._comment_ids = itertools.count(1)
+        self._broadcasts = {}
+        self._loop = None
+        self._server = None
+        self._thread_handle = None
+        self._handlers = {}
+        self._ready = threading.Event()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/api/v1/"
+
+    def start(self):
+        self._thread_handle = threading.Thread(target=self._thread, name="fake-instagram", daemon=True)
+        self._thread_handle.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread_handle.join()
+
+    async def _close(self):
+        self._server.close()
+        # wait_closed() also waits for the open keep-alive connections: close
+        # them and let their handlers see the end of stream.
+        for writer in self._handlers.values():
+            writer.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def _thread(self):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, "127.0.0.1", 0))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers[task] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                method, target, _ = request_line.decode().split(" ", 2)
+                length = 0
+                authorization = ""
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+                    elif name.lower() == "authorization":
+                        authorization = value.strip()
+                if length:
+                    await reader.readexactly(length)
+                status, payload = await self._route(method, target, authorization)
+                body = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._handlers.pop(task, None)
+            writer.close()
+
+    async def _route(self, method, target, authorization):
+        self.requests += 1
+        await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        # instagrapi sessions authenticate with a bearer token, not cookies.
+        if not authorization.startswith("Bearer IGT:2:"):
+            self.unauthorized += 1
+            return "403 Forbidden", {"message": "login_required", "status": "fail"}
+        if self.throttle and random.random() < self.throttle:
+            return "429 Too Many Requests", {
+                "message": "Please wait a few minutes before you try again.",
+                "status": "fail",
+            }
+        path, _, query = target.partition("?")
+        parts = path.strip("/").split("/")[2:]
+        if parts[:2] == ["live", "create"]:
+            broadcast_id = next(self._ids)
+            self._broadcasts[broadcast_id] = {"started": time.time(), "comments": []}
+            return "200 OK", {
+                "broadcast_id": broadcast_id,
+                "upload_url": f"rtmps://live-upload.fake:443/rtmp/{broadcast_id}?s_bl=1&s_sw=0",
+                "status": "ok",
+            }
+        broadcast = self._broadcasts.get(int(parts[1])) if len(parts) > 2 and parts[1].isdigit() else None
+        if broadcast is None:
+            return "404 Not Found", {"message": "broadcast not found", "status": "fail"}
+        action = parts[2]
+        if action in ("start", "end_broadcast"):
+            return "200 OK", {"status": "ok"}
+        if action == "info":
+            return "200 OK", {"viewer_count": self.viewers, "broadcast_status": "active", "status": "ok"}
+        if action == "get_comment":
+            return "200 OK", {"comments": self._comments(broadcast, query), "status": "ok"}
+        if action == "get_viewer_list":
+            users = [{"pk": pk, "username": f"viewer{pk}"} for pk in random.sample(range(self.viewers * 2), self.viewers)]
+            return "200 OK", {"users": users, "status": "ok"}
+        return "404 Not Found", {"message": "unknown endpoint", "status": "fail"}
+
+    def _comments(self, broadcast, query):
+        now = time.time()
+        due = int((now - broadcast["started"]) * self.comment_rate) - len(broadcast["comments"])
+        for _ in range(max(0, due)):
+            pk = next(self._comment_ids)
+            broadcast["comments"].append({
+                "pk": pk,
+                "text": f"comment {pk}",
+                "created_at": int(now),
+                "user": {"username": f"viewer{pk % max(1, self.viewers)}"},
+            })
+        last_ts = 0
+        for item in query.split("&"):
+            if item.startswith("last_comment_ts="):
+                last_ts = int(item.split("=", 1)[1])
+        return [c for c in broadcast["comments"][-100:] if c["created_at"] >= last_ts]
+
+
+class FakeClient:
+    """Stand-in for instagrapi.Client talking to FakeInstagram over HTTP."""
+
+    _user_ids = itertools.count(1000)
+
+    def __init__(self, base_url):
+        import requests
+
+        self.base_url = base_url
+        self.private = requests.Session()
+        self.base_headers = {"User-Agent": "benchmark"}
+        self.user_id = next(self._user_ids)
+        self.authorization = f"Bearer IGT:2:fake-token-{self.user_id}"
+        self.private.headers["Authorization"] = self.authorization
+        self.username = f"account{self.user_id}"
+        self.uuid = f"uuid-{self.user_id}"
+        self.token = "csrftoken"
+
+    def _send_private_request(self, endpoint, data=None, params=None, headers=None, **kwargs):
+        from instagrapi.exceptions import PleaseWaitFewMinutes
+
+        if data is not None:
+            response = self.private.post(self.base_url + endpoint, data=json.dumps(data), params=params)
+        else:
+            response = self.private.get(self.base_url + endpoint, params=params)
+        if response.status_code == 429:
+            raise PleaseWaitFewMinutes(response.json().get("message"))
+        response.raise_for_status()
+        return response.json()
+
+    def get_settings(self):
+        return {}
+
+
+class FakeBot:
+    """Records what the bot would have sent to Telegram."""
+
+    def __init__(self):
+        self.sent = 0
+        self.edited = 0
+        self._message_ids = itertools.count(1)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+        return SimpleNamespace(message_id=next(self._message_ids), chat_id=chat_id, text=text)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self.edited += 1
+        return SimpleNamespace(message_id=message_id, chat_id=chat_id, text=text)
+
+    async def pin_chat_message(self, chat_id, message_id, **kwargs):
+        return True
+
+
+class FakeMessage:
+    def __init__(self, bot, chat_id, text):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.text = text
+
+    async def reply_text(self, text, **kwargs):
+        return await self.bot.send_message(self.chat_id, text)
+
+    async def reply_document(self, document, **kwargs):
+        return await self.bot.send_message(self.chat_id, "<document>")
+
+
+def fake_update(bot, user_id, text):
+    user = SimpleNamespace(id=user_id)
+    chat = SimpleNamespace(id=user_id)
+    return SimpleNamespace(
+        effective_user=user,
+        effective_chat=chat,
+        message=FakeMessage(bot, user_id, text),
+        callback_query=None,
+    )
+
+
+def fake_context(bot, args=()):
+    return SimpleNamespace(bot=bot, user_data={}, args=list(args))
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def report(title, latencies, elapsed, extra=(), unit="handler calls"):
+    print(f"== {title}")
+    for name, values in sorted(latencies.items()):
+        print(
+            f"{name:>16}: n={len(values):6d}  p50={percentile(values, 0.5) * 1000:8.2f}ms  "
+            f"p99={percentile(values, 0.99) * 1000:8.2f}ms  max={max(values, default=0) * 1000:8.2f}ms"
+        )
+    total = sum(len(v) for v in latencies.values())
+    print(f"{'throughput':>16}: {total / elapsed:.1f} {unit}/s over {elapsed:.1f}s")
+    for line in extra:
+        print(f"{line[0]:>16}: {line[1]}")
+
+
+def configure_environment(args):
+    """Settings must be in place before bot.py is imported."""
+    workdir = tempfile.mkdtemp(prefix="instalive-bench-")
+    os.environ.setdefault("SESSION_DB", os.path.join(workdir, "sessions.sqlite3"))
+    os.environ.setdefault("ARCHIVE_DIR", os.path.join(workdir, "archive"))
+    os.environ.setdefault("IG_ACCOUNT_RATE", "1000")
+    os.environ.setdefault("IG_ACCOUNT_BURST", "1000")
+    os.environ.setdefault("SEND_CHAT_RATE", "1000")
+    os.environ.setdefault("SEND_GLOBAL_RATE", "100000")
+    os.environ["IG_ASYNC_HTTP"] = "1" if args.async_http else "0"
+    os.environ["DASHBOARD"] = "1" if args.dashboard else "0"
+    return workdir
+
+
+async def run_handlers(args):
+    fake = FakeInstagram(args.latency, args.comment_rate, args.viewers, args.throttle).start()
+    os.environ["IG_API_URL"] = fake.url
+    os.environ.setdefault("MAX_RESIDENT_CLIENTS", str(args.operators * 2))
+    configure_environment(args)
+    import bot
+
+    tracemalloc.start()
+    fake_bot = FakeBot()
+    bot.sender.bot = fake_bot
+    operators = list(range(1, args.operators + 1))
+    for user_id in operators:
+        bot.cl_dict[user_id] = FakeClient(fake.url)
+
+    latencies = {}
+
+    async def timed(name, handler, user_id, text):
+        started = time.perf_counter()
+        await handler(fake_update(fake_bot, user_id, text), fake_context(fake_bot))
+        latencies.setdefault(name, []).append(time.perf_counter() - started)
+
+    await asyncio.gather(*(
+        timed("start_live", bot.handle_live_title, user_id, f"Benchmark {user_id}") for user_id in operators
+    ))
+
+    actions = [
+        ("get_comments", bot.handle_get_comments, "Get Comments"),
+        ("live_info", bot.handle_live_info, "Live Info"),
+        ("viewer_list", bot.handle_get_viewer_list, "Get Viewer List"),
+    ]
+
+    async def operator(user_id, deadline):
+        while time.perf_counter() < deadline:
+            name, handler, text = random.choice(actions)
+            await timed(name, handler, user_id, text)
+            await asyncio.sleep(random.uniform(0, args.think_time))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(operator(user_id, started + args.duration) for user_id in operators))
+    elapsed = time.perf_counter() - started
+
+    await asyncio.gather(*(timed("stop_live", bot.handle_stop_live, user_id, "Stop Live") for user_id in operators))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    fake.stop()
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    report(
+        f"{args.operators} operators, {'async' if args.async_http else 'threaded'} Instagram client",
+        latencies,
+        elapsed,
+        [
+            ("instagram reqs", f"{fake.requests} ({fake.unauthorized} rejected as logged out)"),
+            ("telegram msgs", fake_bot.sent),
+            ("telegram edits", fake_bot.edited),
+            ("peak traced", f"{peak / 1024 / 1024:.1f} MiB"),
+            ("max rss", f"{rss / 1024:.1f} MiB"),
+        ],
+    )
+
+
+async def run_webhook(args):
+    """Post fake Telegram updates to a running webhook endpoint."""
+    import httpx
+
+    headers = {"Content-Type": "application/json"}
+    if args.secret:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = args.secret
+    update_ids = itertools.count(1)
+    latencies = {"webhook": []}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def post(session, user_id):
+        update_id = next(update_ids)
+        payload = {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+                "text": "/start",
+            },
+        }
+        async with semaphore:
+            started = time.perf_counter()
+            response = await session.post(args.url, content=json.dumps(payload), headers=headers)
+            latencies["webhook"].append(time.perf_counter() - started)
+            if response.status_code != 200:
+                print(f"update {update_id}: HTTP {response.status_code}", file=sys.stderr)
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient() as session:
+        await asyncio.gather(*(post(session, random.randint(1, args.users)) for _ in range(args.updates)))
+    report(f"{args.updates} webhook updates from {args.users} users", latencies, time.perf_counter() - started)
+
+
+def random_word(rng, length):
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(length))
+
+
+def run_moderation(args):
+    """Measure rule compilation and per-comment moderation cost."""
+    configure_environment(args)
+    import bot
+
+    rng = random.Random(args.seed)
+    vocabulary = [random_word(rng, rng.randint(3, 9)) for _ in range(2000)]
+    data = {}
+    for action in bot.MODERATION_ACTIONS:
+        data[action] = {
+            "keywords": [random_word(rng, rng.randint(5, 12)) for _ in range(args.keywords // 3)],
+            "patterns": [rf"\b{random_word(rng, 4)}\d+\b" for _ in range(args.patterns // 3)],
+            "users": [random_word(rng, 10) for _ in range(args.users // 3)],
+        }
+    flagged_words = [keyword for rules in data.values() for keyword in rules["keywords"][:100]]
+
+    started = time.perf_counter()
+    rules = bot.ModerationRules(data)
+    build = time.perf_counter() - started
+
+    comments = []
+    for _ in range(args.comments):
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(3, 20))]
+        if rng.random() < args.flagged:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(flagged_words))
+        comments.append({"username": random_word(rng, 8), "text": " ".join(words)})
+
+    latencies = {"check": []}
+    hits = 0
+    started = time.perf_counter()
+    for comment in comments:
+        before = time.perf_counter()
+        if rules.check(comment) is not None:
+            hits += 1
+        latencies["check"].append(time.perf_counter() - before)
+    elapsed = time.perf_counter() - started
+
+    report(
+        f"{args.keywords} keywords, {args.patterns} patterns, {args.users} blocked users",
+        latencies,
+        elapsed,
+        [
+            ("rule build", f"{build * 1000:.0f}ms, {len(rules._keywords)} automaton states"),
+            ("flagged", f"{hits} of {len(comments)}"),
+        ],
+        unit="comments",
+    )
+
+
+def startup_probe(args):
+    """Run in a fresh interpreter by ``run_startup``; prints one JSON line of timings."""
+    spawned = float(os.environ["BENCHMARK_SPAWNED_AT"])
+    started = time.perf_counter()
+    timings = {"interpreter": time.time() - spawned}
+    configure_environment(args)
+    import bot
+
+    timings["import bot"] = time.perf_counter() - started
+    timings["instagrapi loaded"] = "instagrapi" in sys.modules
+    fake_bot = FakeBot()
+    bot.sender.bot = fake_bot
+    bot.build_application(with_updater=False)
+    timings["build app"] = time.perf_counter() - started
+    asyncio.run(bot.start(fake_update(fake_bot, 1, "/start"), fake_context(fake_bot)))
+    timings["first update"] = time.perf_counter() - started
+    before = time.perf_counter()
+    bot.new_client()
+    timings["first client"] = time.perf_counter() - before
+    before = time.perf_counter()
+    for _ in range(args.clients):
+        bot.new_client()
+    timings["next clients"] = (time.perf_counter() - before) / max(args.clients, 1)
+    print(json.dumps(timings))
+
+
+def run_startup(args):
+    """Time fresh interpreters importing the bot and handling their first update."""
+    latencies = {}
+    loaded = 0
+    started = time.perf_counter()
+    for _ in range(args.runs):
+        env = dict(os.environ, BENCHMARK_SPAWNED_AT=repr(time.time()))
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "startup", "--probe", "--clients", str(args.clients)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        timings = json.loads(output.strip().splitlines()[-1])
+        loaded += timings.pop("instagrapi loaded")
+        for name, value in timings.items():
+            latencies.setdefault(name, []).append(value)
+    report(
+        f"{args.runs} cold starts (cumulative from entering the probe, clients timed alone)",
+        latencies,
+        time.perf_counter() - started,
+        [("eager imports", f"instagrapi imported at start-up in {loaded} of {args.runs} runs")],
+        unit="samples",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    handlers = commands.add_parser("handlers", help="drive the live handlers against a fake Instagram")
+    handlers.add_argument("--operators", type=int, default=100)
+    handlers.add_argument("--duration", type=float, default=10.0)
+    handlers.add_argument("--think-time", type=float, default=0.2, help="max pause between presses")
+    handlers.add_argument("--latency", type=float, default=0.05, help="mean fake Instagram latency")
+    handlers.add_argument("--comment-rate", type=float, default=10.0, help="comments per second per live")
+    handlers.add_argument("--viewers", type=int, default=200)
+    handlers.add_argument("--throttle", type=float, default=0.0, help="probability of a 429 answer")
+    handlers.add_argument("--async-http", action="store_true", help="use AsyncInstagramLive")
+    handlers.add_argument("--dashboard", action="store_true", help="edit a pinned dashboard instead of sending replies")
+
+    webhook = commands.add_parser("webhook", help="post fake Telegram updates to a webhook endpoint")
+    webhook.add_argument("--url", required=True)
+    webhook.add_argument("--secret", default="")
+    webhook.add_argument("--updates", type=int, default=1000)
+    webhook.add_argument("--users", type=int, default=100)
+    webhook.add_argument("--concurrency", type=int, default=40)
+
+    moderation = commands.add_parser("moderation", help="run the moderation rules over synthetic comments")
+    moderation.add_argument("--keywords", type=int, default=30000)
+    moderation.add_argument("--patterns", type=int, default=30)
+    moderation.add_argument("--users", type=int, default=3000)
+    moderation.add_argument("--comments", type=int, default=100000)
+    moderation.add_argument("--flagged", type=float, default=0.05, help="share of comments containing a keyword")
+    moderation.add_argument("--seed", type=int, default=1)
+    moderation.set_defaults(async_http=False, dashboard=False)
+
+    startup = commands.add_parser("startup", help="measure import time and time to the first handled update")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--clients", type=int, default=20, help="clients built after the first one")
+    startup.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    startup.set_defaults(async_http=False, dashboard=False)
+
+    args = parser.parse_args()
+    if args.command == "handlers":
+        asyncio.run(run_handlers(args))
+    elif args.command == "webhook":
+        asyncio.run(run_webhook(args))
+    elif args.command == "moderation":
+        run_moderation(args)
+    elif args.command == "startup":
+        if args.probe:
+            startup_probe(args)
+        else:
+            run_startup(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,41 @@
+import asyncio
+import bisect
+import functools
+import heapq
+import http.cookiejar
+import importlib
+import inspect
+import itertools
+import json
 import logging
+import logging.handlers
+import math
+import queue
+import multiprocessing
 import os
-
+import random
+import re
+import secrets
+import sqlite3
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import httpx
 from telegram import (
     Update,
     ReplyKeyboardMarkup,
     ReplyKeyboardRemove,
     InlineKeyboardMarkup,
     InlineKeyboardButton,
+    InputFile,
 )
 from telegram.ext import (
     ApplicationBuilder,
+    BaseUpdateProcessor,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
@@ -18,40 +44,744 @@ from telegram.ext import (
     ConversationHandler,
 )
 
-from instagrapi import Client
-from instagrapi.exceptions import (
-    TwoFactorRequired,
-    ChallengeRequired,
-    BadCredentials,
-    ReloginAttemptExceeded,
-    PleaseWaitFewMinutes,
-    ClientThrottledError,
-)
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
 
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO
-)
+if TYPE_CHECKING:
+    from instagrapi import Client
+
+log = logging.getLogger("bot")
+ig_log = logging.getLogger("bot.instagram")
+poll_log = logging.getLogger("bot.poll")
+tg_log = logging.getLogger("bot.telegram")
+
+
+class LazyModule:
+    """A module imported on first attribute access.
+
+    instagrapi pulls in pydantic and requests, which dominates the bot's
+    start-up time, while a freshly started worker has nothing to do on
+    Instagram until a user logs in. Attributes are cached on first lookup.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            started = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            log.debug("Imported %s in %.3fs", self._name, time.perf_counter() - started)
+        value = getattr(self._module, attr)
+        setattr(self, attr, value)
+        return value
+
+
+instagrapi = LazyModule("instagrapi")
+ig_errors = LazyModule("instagrapi.exceptions")
 
-logging.getLogger("instagrapi").setLevel(logging.DEBUG)
+_background_tasks = set()
+
+
+def spawn(coro):
+    """Run ``coro`` in the background, keeping a reference until it is done and logging its failure."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_done)
+    return task
+
+
+def _background_done(task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        log.error("Background task failed: %s", task.exception(), exc_info=task.exception())
 
 TOKEN = "YOUR_TELEGRAM_BOT_TOKEN"
 
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", "1"))
+WEBHOOK_WORKER_BASE_PORT = int(os.environ.get("WEBHOOK_WORKER_BASE_PORT", str(WEBHOOK_PORT + 1)))
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get("WEBHOOK_MAX_CONNECTIONS", "40"))
+# Which share of the users this process serves: user_id % WORKER_COUNT == WORKER_INDEX.
+# Set by the webhook workers themselves, or by hand when running shards separately.
+WORKER_INDEX = int(os.environ.get("WORKER_INDEX", "0"))
+WORKER_COUNT = int(os.environ.get("WORKER_COUNT", "1"))
+
 ASK_USERNAME, ASK_PASSWORD, ASK_2FA, ASK_CHALLENGE, ASK_SAVE_SESSION = range(5)
 ASK_TITLE = 0
-current_broadcast = None
+BROADCAST_CREATED, BROADCAST_STARTED, BROADCAST_ENDED = "created", "started", "ended"
+
+SESSION_DB = os.environ.get("SESSION_DB", "sessions.sqlite3")
+SESSION_VERIFY_TTL = float(os.environ.get("SESSION_VERIFY_TTL", "21600"))
+SESSION_REFRESH_INTERVAL = float(os.environ.get("SESSION_REFRESH_INTERVAL", "600"))
+SESSION_REFRESH_CONCURRENCY = int(os.environ.get("SESSION_REFRESH_CONCURRENCY", "4"))
+SESSION_REFRESH_STAGGER = float(os.environ.get("SESSION_REFRESH_STAGGER", "2"))
+SESSION_REFRESH_BATCH = int(os.environ.get("SESSION_REFRESH_BATCH", "50"))
+SESSION_REFRESH_RETRY = 1800
+SCHEDULE_LEAD = float(os.environ.get("SCHEDULE_LEAD", "300"))
+SCHEDULE_JITTER = float(os.environ.get("SCHEDULE_JITTER", "60"))
+SCHEDULE_CONCURRENCY = int(os.environ.get("SCHEDULE_CONCURRENCY", "8"))
+SCHEDULE_GRACE = float(os.environ.get("SCHEDULE_GRACE", "600"))
+SCHEDULE_USER_LIMIT = 10
+SCHEDULE_MAX_SLEEP = 60
+IG_ACCOUNT_RATE = float(os.environ.get("IG_ACCOUNT_RATE", "1"))
+IG_ACCOUNT_BURST = float(os.environ.get("IG_ACCOUNT_BURST", "5"))
+IG_THROTTLE_PAUSE = float(os.environ.get("IG_THROTTLE_PAUSE", "60"))
+IG_MAX_ADMISSION_WAIT = float(os.environ.get("IG_MAX_ADMISSION_WAIT", "10"))
+IG_BACKOFF_BASE = float(os.environ.get("IG_BACKOFF_BASE", "2"))
+IG_BACKOFF_MAX = float(os.environ.get("IG_BACKOFF_MAX", "60"))
+IG_CIRCUIT_FAILURES = int(os.environ.get("IG_CIRCUIT_FAILURES", "5"))
+IG_CIRCUIT_COOLDOWN = float(os.environ.get("IG_CIRCUIT_COOLDOWN", "60"))
+IG_RETRIES = {0: 4, 1: 2, 2: 0}
+PREWARM_BROADCASTS = os.environ.get("PREWARM_BROADCASTS", "0") == "1"
+PREWARM_TIMEOUT = float(os.environ.get("PREWARM_TIMEOUT", "120"))
+PREWARM_TITLE = os.environ.get("PREWARM_TITLE", "Instagram Live")
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "instagrapi=WARNING,httpx=WARNING")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+LOG_FILE = os.environ.get("LOG_FILE", "")
+LOG_SAMPLED = os.environ.get("LOG_SAMPLED", "bot.poll")
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1"))
+LOG_SAMPLE_BURST = float(os.environ.get("LOG_SAMPLE_BURST", "10"))
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "archive")
+ARCHIVE_FLUSH_INTERVAL = float(os.environ.get("ARCHIVE_FLUSH_INTERVAL", "2"))
+ARCHIVE_INDEX_EVERY = int(os.environ.get("ARCHIVE_INDEX_EVERY", "1000"))
+ARCHIVE_BUFFER_BYTES = 64 * 1024
+ARCHIVE_IDLE_CLOSE = 300
+EXPORT_PART_BYTES = int(os.environ.get("EXPORT_PART_BYTES", str(8 * 1024 * 1024)))
+RELAY_ENABLED = os.environ.get("RELAY_ENABLED", "0") == "1"
+FFMPEG_BIN = os.environ.get("FFMPEG_BIN", "ffmpeg")
+RELAY_PROTOCOL = os.environ.get("RELAY_PROTOCOL", "rtmp")
+RELAY_LISTEN_HOST = os.environ.get("RELAY_LISTEN_HOST", "127.0.0.1")
+RELAY_PUBLIC_HOST = os.environ.get("RELAY_PUBLIC_HOST", RELAY_LISTEN_HOST)
+RELAY_PORT_BASE = int(os.environ.get("RELAY_PORT_BASE", "19350"))
+RELAY_PORT_COUNT = int(os.environ.get("RELAY_PORT_COUNT", "100"))
+RELAY_DESTINATIONS = [url.strip() for url in os.environ.get("RELAY_DESTINATIONS", "").split(",") if url.strip()]
+RELAY_RESTART_DELAY = 2.0
+RELAY_RESTART_MAX_DELAY = 30.0
+RELAY_STABLE_AFTER = 60.0
+RELAY_STALL_TIMEOUT = float(os.environ.get("RELAY_STALL_TIMEOUT", "15"))
+METRICS_LISTEN = os.environ.get("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+ADMIN_IDS = {int(i) for i in os.environ.get("ADMIN_IDS", "").split(",") if i.strip()}
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+LOOP_LAG_INTERVAL = 0.5
+MAX_RESIDENT_CLIENTS = int(os.environ.get("MAX_RESIDENT_CLIENTS", "200"))
+IG_EXECUTOR_WORKERS = int(os.environ.get("IG_EXECUTOR_WORKERS", "16"))
+MAX_CONCURRENT_UPDATES = int(os.environ.get("MAX_CONCURRENT_UPDATES", "256"))
+IG_ASYNC_HTTP = os.environ.get("IG_ASYNC_HTTP", "0") == "1"
+IG_CLIENT_TEMPLATE = os.environ.get("IG_CLIENT_TEMPLATE", "")
+IG_API_URL = os.environ.get("IG_API_URL", "https://i.instagram.com/api/v1/")
+IG_HTTP_MAX_CONNECTIONS = int(os.environ.get("IG_HTTP_MAX_CONNECTIONS", "20"))
+IG_HTTP_TIMEOUT = float(os.environ.get("IG_HTTP_TIMEOUT", "15"))
+COMMENT_POLL_INTERVAL = float(os.environ.get("COMMENT_POLL_INTERVAL", "3"))
+INFO_POLL_INTERVAL = float(os.environ.get("INFO_POLL_INTERVAL", "10"))
+VIEWER_POLL_INTERVAL = float(os.environ.get("VIEWER_POLL_INTERVAL", "15"))
+POLL_MAX_INTERVAL = float(os.environ.get("POLL_MAX_INTERVAL", "60"))
+POLL_THROTTLE_INTERVAL = float(os.environ.get("POLL_THROTTLE_INTERVAL", "180"))
+INFO_CACHE_TTL = float(os.environ.get("INFO_CACHE_TTL", "5"))
+VIEWER_CACHE_TTL = float(os.environ.get("VIEWER_CACHE_TTL", "10"))
+CACHE_STALE_TTL = float(os.environ.get("CACHE_STALE_TTL", "60"))
+POLL_BACKOFF = 1.5
+TELEGRAM_MESSAGE_LIMIT = 4096
+SEND_CHAT_RATE = float(os.environ.get("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = float(os.environ.get("SEND_CHAT_BURST", "3"))
+SEND_GLOBAL_RATE = float(os.environ.get("SEND_GLOBAL_RATE", "25"))
+SEND_QUEUE_LIMIT = 500
+SEND_RETRIES = 5
+DASHBOARD = os.environ.get("DASHBOARD", "0") == "1"
+DASHBOARD_REFRESH = float(os.environ.get("DASHBOARD_REFRESH", "5"))
+DASHBOARD_COMMENTS = 10
+DASHBOARD_ACTIVITY = 5
+POLL_TICK = 0.5
+POLL_WHEEL_SLOTS = 512
+COMMENT_SEEN_LIMIT = int(os.environ.get("COMMENT_SEEN_LIMIT", "5000"))
+MODERATION_RULES = os.environ.get("MODERATION_RULES", "")
+MODERATION_RELOAD_INTERVAL = 2.0
+# Every pattern is tried at every position of every comment, so their number
+# and size are capped to keep a rules file from stalling comment handling.
+MODERATION_MAX_PATTERNS = int(os.environ.get("MODERATION_MAX_PATTERNS", "100"))
+MODERATION_MAX_PATTERN_LENGTH = int(os.environ.get("MODERATION_MAX_PATTERN_LENGTH", "200"))
+
+
+class SamplingFilter(logging.Filter):
+    """Rate limits records of high-frequency loggers.
+
+    Each (logger, message template) pair gets a token bucket; records over
+    budget are dropped and counted, and the next record let through reports
+    how many similar ones were suppressed.
+    """
+
+    def __init__(self, prefixes, rate=LOG_SAMPLE_RATE, burst=LOG_SAMPLE_BURST):
+        super().__init__()
+        self.prefixes = tuple(prefixes)
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not record.name.startswith(self.prefixes):
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if bucket.reserve() > 0:
+                bucket.tokens += 1
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            record.suppressed = self._suppressed.pop(key, 0)
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread."""
+
+    def prepare(self, record):
+        return record
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" ({suppressed} similar messages suppressed)"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra`` fields."""
+
+    _standard = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self._standard and value:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+log_listener = None
+
+
+def setup_logging():
+    """Configure logging from the LOG_* settings.
+
+    Records are handed to a background listener thread through a queue, so
+    formatting and log I/O never run on the event loop or the Instagram
+    worker threads.
+    """
+    global log_listener
+    if LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    handlers = [logging.StreamHandler()]
+    if LOG_FILE:
+        handlers.append(logging.handlers.WatchedFileHandler(LOG_FILE))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    if LOG_SAMPLED:
+        queue_handler.addFilter(SamplingFilter(p.strip() for p in LOG_SAMPLED.split(",") if p.strip()))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL.upper())
+    for item in LOG_LEVELS.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+    if log_listener is not None:
+        log_listener.stop()
+    log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    log_listener.start()
+
+
+def stop_logging():
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms in the Prometheus text format.
+
+    Labels are passed as a tuple of ``(name, value)`` pairs. Gauges are
+    either set directly or read from a callback when rendering.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._gauge_callbacks = {}
+        self._histograms = {}
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + value
+
+    def set(self, name, value, labels=()):
+        with self._lock:
+            self._gauges[(name, labels)] = value
+
+    def gauge(self, name, callback):
+        self._gauge_callbacks[name] = callback
+
+    def observe(self, name, value, labels=()):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def histogram(self, name, labels=()):
+        return self._histograms.get((name, labels))
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = labels + extra
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name in sorted({n for n, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(
+                    f"{name}{self._labels(labels)} {value}"
+                    for (n, labels), value in self._counters.items() if n == name
+                )
+            gauges = dict(self._gauges)
+            histograms = list(self._histograms.items())
+        for name, callback in self._gauge_callbacks.items():
+            gauges[(name, ())] = callback()
+        for name in sorted({n for n, _ in gauges}):
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(f"{name}{self._labels(labels)} {value}" for (n, labels), value in gauges.items() if n == name)
+        for name in sorted({n for (n, _), _ in histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (n, labels), histogram in histograms:
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + [float("inf")], histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else bound
+                    lines.append(f"{name}_bucket{self._labels(labels, (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{self._labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Short human readable report for the /stats command."""
+        lines = [f"{name}: {callback()}" for name, callback in self._gauge_callbacks.items()]
+        with self._lock:
+            lag = self._gauges.get(("event_loop_lag_seconds", ()), 0.0)
+            lines.append(f"event_loop_lag_seconds: {lag:.3f}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name != "instagram_request_seconds":
+                    continue
+                endpoint = dict(labels).get("endpoint", "")
+                lines.append(
+                    f"{endpoint}: n={histogram.count} "
+                    f"p50<={histogram.quantile(0.5)}s p99<={histogram.quantile(0.99)}s"
+                )
+            for (name, labels), value in sorted(self._counters.items()):
+                if name.endswith("_total"):
+                    label_text = ",".join(f"{k}={v}" for k, v in labels)
+                    lines.append(f"{name}{'{' + label_text + '}' if label_text else ''}: {value}")
+        return "\n".join(lines)
+
+
+metrics = Metrics()
+
+
+async def monitor_event_loop_lag(interval=LOOP_LAG_INTERVAL):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        metrics.set("event_loop_lag_seconds", lag)
+        metrics.observe("event_loop_lag_histogram_seconds", lag)
+
+
+class MetricsServer:
+    """Minimal HTTP server exposing ``GET /metrics``."""
+
+    def __init__(self, host=METRICS_LISTEN, port=METRICS_PORT):
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1] == b"/metrics":
+                status, body = "200 OK", metrics.render().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW = range(3)
+
+
+class PriorityLock:
+    """asyncio lock handing itself to the most urgent waiter first.
+
+    Waiters with a lower priority value go first, FIFO within the same
+    priority, so starting or ending a live overtakes queued polls.
+    """
+
+    def __init__(self):
+        self._locked = False
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def locked(self):
+        return self._locked
+
+    async def acquire(self, priority=PRIORITY_NORMAL):
+        if not self._locked and not self._waiters:
+            self._locked = True
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The lock was handed over just before the cancellation.
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(True)
+                return
+        self._locked = False
+
+
+class InstagramExecutor:
+    """Runs blocking Instagram calls on a bounded thread pool.
+
+    Calls are serialized per account key (the Telegram user id owning the
+    Client), so a single instagrapi Client is never used from two threads at
+    once, while different accounts proceed in parallel without blocking the
+    event loop. Queued calls of one account run in ``priority`` order.
+    """
+
+    def __init__(self, max_workers=IG_EXECUTOR_WORKERS):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="instagram")
+        self._locks = {}
+
+    def _lock_for(self, key):
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = PriorityLock()
+        return lock
+
+    async def run(self, key, fn, *args, priority=PRIORITY_NORMAL, **kwargs):
+        queued_at = time.perf_counter()
+        lock = self._lock_for(key)
+        await lock.acquire(priority)
+        try:
+            if inspect.iscoroutinefunction(fn):
+                metrics.observe("instagram_executor_wait_seconds", time.perf_counter() - queued_at)
+                return await fn(*args, **kwargs)
+
+            def call():
+                metrics.observe("instagram_executor_wait_seconds", time.perf_counter() - queued_at)
+                return fn(*args, **kwargs)
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, call)
+        finally:
+            lock.release()
+
+    def busy(self, key):
+        lock = self._locks.get(key)
+        return lock is not None and lock.locked()
+
+    def forget(self, key):
+        lock = self._locks.get(key)
+        if lock is not None and not lock.locked():
+            del self._locks[key]
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+ig_executor = InstagramExecutor()
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class Circuit:
+    __slots__ = ("failures", "opened_at")
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = 0.0
+
+
+class RequestGovernor:
+    """Admission control and retries for Instagram private API requests.
+
+    Every account has a token bucket sized by ``IG_ACCOUNT_RATE`` and
+    ``IG_ACCOUNT_BURST``; a throttling answer pushes the bucket into debt so
+    the whole account pauses. Each (account, endpoint) pair has a circuit
+    breaker that fails fast after repeated errors. High priority requests
+    (creating, starting and ending lives) never wait for the bucket, ignore
+    open circuits and are retried with jittered exponential backoff; normal
+    priority requests wait at most ``IG_MAX_ADMISSION_WAIT`` seconds and low
+    priority polls are refused instead of queueing when over budget.
+
+    All waiting happens on the event loop, before the request takes the
+    account's ``ig_executor`` lock and a worker thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._circuits = {}
+
+    @staticmethod
+    def endpoint_key(endpoint):
+        return re.sub(r"\d+", "{id}", endpoint)
+
+    def _admit(self, account, endpoint, priority):
+        """Return how long to wait before sending, or raise if the request must not be sent."""
+        now = time.monotonic()
+        with self._lock:
+            circuit = self._circuits.get((account, endpoint))
+            if (
+                priority != PRIORITY_HIGH
+                and circuit is not None
+                and circuit.failures >= IG_CIRCUIT_FAILURES
+                and now - circuit.opened_at < IG_CIRCUIT_COOLDOWN
+            ):
+                metrics.inc("instagram_requests_refused_total", (("reason", "circuit_open"),))
+                raise CircuitOpenError(f"{endpoint} is failing for account {account}, retrying later")
+            bucket = self._buckets.get(account)
+            if bucket is None:
+                bucket = self._buckets[account] = TokenBucket(IG_ACCOUNT_RATE, IG_ACCOUNT_BURST)
+            wait = bucket.reserve()
+            if priority == PRIORITY_HIGH:
+                return 0.0
+            if (priority == PRIORITY_LOW and wait > 0) or wait > IG_MAX_ADMISSION_WAIT:
+                bucket.tokens += 1
+                metrics.inc("instagram_requests_refused_total", (("reason", "budget"),))
+                raise BudgetExceeded(f"Request budget of account {account} exhausted for {wait:.0f}s")
+            return wait
+
+    def _record(self, account, endpoint, error):
+        with self._lock:
+            circuit = self._circuits.get((account, endpoint))
+            if error is None:
+                if circuit is not None:
+                    del self._circuits[(account, endpoint)]
+                return
+            throttled = is_throttle_error(error)
+            metrics.inc(
+                "instagram_request_errors_total",
+                (("endpoint", endpoint), ("kind", "throttle" if throttled else type(error).__name__)),
+            )
+            if circuit is None:
+                circuit = self._circuits[(account, endpoint)] = Circuit()
+            circuit.failures += 1
+            if circuit.failures >= IG_CIRCUIT_FAILURES:
+                circuit.opened_at = time.monotonic()
+            if throttled:
+                bucket = self._buckets.get(account)
+                if bucket is not None:
+                    bucket.tokens = min(bucket.tokens, -IG_THROTTLE_PAUSE * bucket.rate)
+
+    @staticmethod
+    def _retryable(error, priority, idempotent):
+        if is_throttle_error(error):
+            # The throttle just put the account IG_THROTTLE_PAUSE seconds in
+            # debt; only high priority requests are admitted before that.
+            return priority == PRIORITY_HIGH
+        # A timeout or a server error doesn't tell whether the request went
+        # through, so only requests that are safe to repeat are resent.
+        if not idempotent:
+            return False
+        if isinstance(error, AsyncInstagramError):
+            return error.status_code is not None and error.status_code >= 500
+        return isinstance(error, (
+            ig_errors.ClientConnectionError, ig_errors.ClientRequestTimeout, httpx.TransportError,
+            ConnectionError, TimeoutError,
+        ))
+
+    @staticmethod
+    def _backoff(attempt, error):
+        base = IG_BACKOFF_BASE * (5 if is_throttle_error(error) else 1)
+        return min(IG_BACKOFF_MAX, base * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+    @staticmethod
+    def _timed(endpoint, fn):
+        labels = (("endpoint", endpoint),)
+        if inspect.iscoroutinefunction(fn):
+            async def timed():
+                started = time.perf_counter()
+                try:
+                    return await fn()
+                finally:
+                    metrics.observe("instagram_request_seconds", time.perf_counter() - started, labels)
+        else:
+            def timed():
+                started = time.perf_counter()
+                try:
+                    return fn()
+                finally:
+                    metrics.observe("instagram_request_seconds", time.perf_counter() - started, labels)
+        return timed
+
+    async def run(self, key, account, endpoint, fn, priority=PRIORITY_NORMAL, idempotent=True):
+        """Send a request through ``ig_executor`` under ``key``.
+
+        ``fn`` is a blocking call or a coroutine function. Up to
+        ``IG_RETRIES[priority]`` retries are made: high priority requests are
+        retried after a throttle, others give up at once. Requests that are
+        not ``idempotent`` are only retried after a throttle.
+        """
+        endpoint = self.endpoint_key(endpoint)
+        timed = self._timed(endpoint, fn)
+        for attempt in itertools.count():
+            await asyncio.sleep(self._admit(account, endpoint, priority))
+            try:
+                result = await ig_executor.run(key, timed, priority=priority)
+            except Exception as e:
+                self._record(account, endpoint, e)
+                if attempt >= IG_RETRIES[priority] or not self._retryable(e, priority, idempotent):
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                continue
+            self._record(account, endpoint, None)
+            return result
+
+
+governor = RequestGovernor()
+
+
+def account_key(username):
+    """Key of an Instagram account's budget and circuits; usernames are case-insensitive."""
+    return username.casefold()
+
+
+def client_account(client):
+    return account_key(getattr(client, "username", None) or str(client.user_id))
 
-cl_dict = {}
 
 class InstagramLive:
-    def __init__(self, client: Client):
+    def __init__(self, client: "Client", user_id):
         self.client = client
+        # Requests are serialized per Telegram user on ig_executor and
+        # budgeted per Instagram account.
+        self.user_id = user_id
+        self.account = client_account(client)
         self.broadcast_id = None
         self.stream_server = None
         self.stream_key = None
+        self.last_error = None
+
+    async def _request(self, endpoint, priority, data=None, params=None, idempotent=True):
+        return await governor.run(
+            self.user_id, self.account, endpoint, functools.partial(self._send, endpoint, data, params),
+            priority, idempotent,
+        )
 
-    def create_broadcast(self, title="Instagram Live"):
-        data = {
+    def _send(self, endpoint, data=None, params=None):
+        # Not private_request: on a timeout it sleeps 60 seconds in the worker
+        # thread and sends the request again, behind the governor's back and
+        # even when it must not be repeated. It also adds the bearer token.
+        authorization = self.client.authorization
+        headers = {"Authorization": authorization} if authorization else None
+        return self.client._send_private_request(endpoint, data=data, params=params, headers=headers)
+
+    def _create_data(self, title):
+        return {
             "_uuid": self.client.uuid,
             "_uid": self.client.user_id,
             "preview_height": 1920,
@@ -61,137 +791,1995 @@ class InstagramLive:
             "internal_only": 0,
             "_csrftoken": self.client.token,
         }
-        try:
-            response = self.client.private_request("live/create/", data=data)
-            self.broadcast_id = response["broadcast_id"]
-            upload_url = response["upload_url"].split(str(self.broadcast_id))
-            if len(upload_url) >= 2:
-                self.stream_server = upload_url[0]
-                self.stream_key = f"{self.broadcast_id}{upload_url[1]}"
-                return {"stream_server": self.stream_server, "stream_key": self.stream_key}
-        except Exception as e:
-            logging.error(f"Error during live creation: {e}")
-            return None
 
-    def start_broadcast(self):
-        data = {
+    def _start_data(self):
+        return {
             "_uuid": self.client.uuid,
             "_uid": self.client.user_id,
             "should_send_notifications": 1,
             "_csrftoken": self.client.token,
         }
-        try:
-            self.client.private_request(f"live/{self.broadcast_id}/start/", data=data)
-            return True
-        except Exception as e:
-            logging.error(f"Error starting the live: {e}")
-            return False
 
-    def end_broadcast(self):
-        data = {
+    def _end_data(self):
+        return {
             "_uuid": self.client.uuid,
             "_uid": self.client.user_id,
             "_csrftoken": self.client.token,
         }
+
+    def _parse_created(self, response):
+        self.broadcast_id = response["broadcast_id"]
+        upload_url = response["upload_url"].split(str(self.broadcast_id))
+        if len(upload_url) >= 2:
+            self.stream_server = upload_url[0]
+            self.stream_key = f"{self.broadcast_id}{upload_url[1]}"
+            return {"stream_server": self.stream_server, "stream_key": self.stream_key}
+        return None
+
+    def _parse_info(self, response):
+        return {
+            "broadcast_id": self.broadcast_id,
+            "stream_server": self.stream_server,
+            "stream_key": self.stream_key,
+            "viewer_count": response.get('viewer_count', 'N/A'),
+            "status": response.get('broadcast_status', 'N/A'),
+        }
+
+    def _parse_comments(self, response):
+        if 'comments' in response:
+            return [
+                {
+                    "pk": c["pk"],
+                    "username": c["user"]["username"],
+                    "text": c["text"],
+                    "created_at": c.get("created_at", 0),
+                }
+                for c in response['comments']
+            ]
+        return []
+
+    def _parse_viewers(self, response):
+        users = []
+        ids = []
+        for user in response.get('users', []):
+            users.append(user['username'])
+            ids.append(user['pk'])
+        return users, ids
+
+    async def create_broadcast(self, title="Instagram Live"):
+        self.last_error = None
+        try:
+            response = await self._request(
+                "live/create/", PRIORITY_HIGH, data=self._create_data(title), idempotent=False
+            )
+            return self._parse_created(response)
+        except Exception as e:
+            self.last_error = e
+            ig_log.error("Error during live creation: %s", e)
+            return None
+
+    async def start_broadcast(self):
+        self.last_error = None
+        try:
+            await self._request(
+                f"live/{self.broadcast_id}/start/", PRIORITY_HIGH, data=self._start_data(), idempotent=False
+            )
+            return True
+        except Exception as e:
+            self.last_error = e
+            ig_log.error("Error starting the live: %s", e)
+            return False
+
+    async def end_broadcast(self):
+        self.last_error = None
         try:
-            self.client.private_request(f"live/{self.broadcast_id}/end_broadcast/", data=data)
+            await self._request(f"live/{self.broadcast_id}/end_broadcast/", PRIORITY_HIGH, data=self._end_data())
             return True
         except Exception as e:
-            logging.error(f"Error ending the live: {e}")
+            self.last_error = e
+            ig_log.error("Error ending the live: %s", e)
             return False
 
-    def live_info(self):
+    # The polls raise on failure instead of setting ``last_error``: several
+    # of them run for the same broadcast and each needs its own outcome.
+
+    async def live_info(self):
+        try:
+            response = await self._request(f"live/{self.broadcast_id}/info/", PRIORITY_LOW)
+        except BudgetExceeded as e:
+            # Expected while the account is over budget: the next poll retries.
+            poll_log.debug("Live info of %s skipped: %s", self.broadcast_id, e)
+            raise
+        except Exception as e:
+            poll_log.error("Error retrieving live info of %s: %s", self.broadcast_id, e)
+            raise
+        return self._parse_info(response)
+
+    def _comment_params(self, last_comment_ts):
+        if last_comment_ts:
+            return {"last_comment_ts": last_comment_ts, "num_comments_requested": 100}
+        return None
+
+    async def get_comments(self, last_comment_ts=None):
+        try:
+            response = await self._request(
+                f"live/{self.broadcast_id}/get_comment/", PRIORITY_LOW, params=self._comment_params(last_comment_ts)
+            )
+        except BudgetExceeded as e:
+            poll_log.debug("Comments of %s skipped: %s", self.broadcast_id, e)
+            raise
+        except Exception as e:
+            poll_log.error("Error retrieving comments of %s: %s", self.broadcast_id, e)
+            raise
+        return self._parse_comments(response)
+
+    async def get_viewer_list(self):
         try:
-            response = self.client.private_request(f"live/{self.broadcast_id}/info/")
-            viewer_count = response.get('viewer_count', 'N/A')
-            status = response.get('broadcast_status', 'N/A')
-            return {
-                "broadcast_id": self.broadcast_id,
-                "stream_server": self.stream_server,
-                "stream_key": self.stream_key,
-                "viewer_count": viewer_count,
-                "status": status,
-            }
+            response = await self._request(f"live/{self.broadcast_id}/get_viewer_list/", PRIORITY_LOW)
+        except BudgetExceeded as e:
+            poll_log.debug("Viewer list of %s skipped: %s", self.broadcast_id, e)
+            raise
         except Exception as e:
-            logging.error(f"Error retrieving live info: {e}")
+            poll_log.warning("Failed to retrieve viewer list of %s: %s", self.broadcast_id, e)
+            raise
+        users, ids = self._parse_viewers(response)
+        poll_log.debug("Viewer list of %s retrieved: %s", self.broadcast_id, users)
+        return users, ids
+
+
+class AsyncInstagramError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_throttle_error(error):
+    if isinstance(error, (ig_errors.PleaseWaitFewMinutes, ig_errors.ClientThrottledError)):
+        return True
+    if isinstance(error, AsyncInstagramError):
+        return error.status_code == 429 or "wait a few minutes" in str(error).lower()
+    return False
+
+
+def is_session_error(error):
+    """Whether Instagram rejected a stored session, as opposed to a refused or failed request."""
+    return isinstance(
+        error,
+        (ig_errors.LoginRequired, ig_errors.BadCredentials, ig_errors.ReloginAttemptExceeded, ig_errors.UserNotFound),
+    )
+
+
+_http_session = None
+
+
+def get_http_session():
+    """Return the process-wide keep-alive HTTP session used by AsyncInstagramLive.
+
+    The session is shared by every account, so its cookie jar refuses all
+    cookies: each request carries its account's cookies explicitly and
+    response cookies are copied back into that account's Client only.
+    """
+    global _http_session
+    if _http_session is None or _http_session.is_closed:
+        _http_session = httpx.AsyncClient(
+            base_url=IG_API_URL,
+            cookies=http.cookiejar.CookieJar(policy=http.cookiejar.DefaultCookiePolicy(allowed_domains=[])),
+            limits=httpx.Limits(
+                max_connections=IG_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=IG_HTTP_MAX_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(IG_HTTP_TIMEOUT),
+        )
+    return _http_session
+
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None:
+        await _http_session.aclose()
+        _http_session = None
+
+
+class AsyncInstagramLive(InstagramLive):
+    """InstagramLive over a shared asyncio HTTP session.
+
+    Speaks the same private endpoints as InstagramLive, but instead of going
+    through the blocking instagrapi Client in a worker thread it reuses the headers and
+    cookies of the logged in instagrapi Client on a pooled keep-alive
+    connection, so many broadcasts share a handful of sockets.
+    """
+
+    def _headers(self, signed):
+        headers = dict(self.client.base_headers)
+        # Like instagrapi's private_request: sessions authenticate with the
+        # "Bearer IGT:2:..." token built from the client's authorization data.
+        authorization = self.client.authorization
+        if authorization:
+            headers["Authorization"] = authorization
+        cookies = self.client.private.cookies.get_dict()
+        if cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in cookies.items())
+        if signed:
+            headers["Content-Type"] = "application/x-www-form-urlencoded; charset=UTF-8"
+        return headers
+
+    async def _send(self, endpoint, data=None, params=None):
+        session = get_http_session()
+        if data is not None:
+            body = json.dumps(data, separators=(",", ":"))
+            response = await session.post(
+                endpoint,
+                content=f"signed_body=SIGNATURE.{urllib.parse.quote_plus(body)}",
+                params=params,
+                headers=self._headers(signed=True),
+            )
+        else:
+            response = await session.get(endpoint, params=params, headers=self._headers(signed=False))
+        # Keep the instagrapi session in sync (e.g. rotated csrftoken) so the
+        # blocking client can still be used or dumped afterwards.
+        for name, value in response.cookies.items():
+            self.client.private.cookies.set(name, value)
+        try:
+            payload = response.json()
+        except ValueError:
+            raise AsyncInstagramError(
+                f"{endpoint}: HTTP {response.status_code}, non-JSON response", response.status_code
+            )
+        if response.status_code >= 400 or payload.get("status") == "fail":
+            raise AsyncInstagramError(
+                f"{endpoint}: HTTP {response.status_code}, {payload.get('message', payload)}", response.status_code
+            )
+        return payload
+
+
+def make_instagram_live(client, user_id):
+    if IG_ASYNC_HTTP:
+        return AsyncInstagramLive(client, user_id)
+    return InstagramLive(client, user_id)
+
+
+class TokenBucket:
+    """Classic token bucket. ``reserve`` takes a token, going into debt if
+    needed, and returns how long the caller must wait before using it."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def reserve(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+def split_message(text, limit=TELEGRAM_MESSAGE_LIMIT):
+    """Split text into chunks of at most ``limit`` characters on line boundaries."""
+    chunks = []
+    current = []
+    size = 0
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if current and size + 1 + len(line) > limit:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        size += len(line) + (1 if current else 0)
+        current.append(line)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class MessageSender:
+    """Outbound Telegram message queue.
+
+    Messages are queued per chat and delivered by one task per busy chat.
+    Updates that pile up while a chat is rate limited are merged into as few
+    messages as fit the 4096 character limit, long payloads are split on
+    line boundaries, per-chat and global token buckets keep the bot under
+    Telegram's flood limits and ``RetryAfter`` is honoured.
+    """
+
+    def __init__(self, bot=None):
+        self.bot = bot
+        self._global = TokenBucket(SEND_GLOBAL_RATE, SEND_GLOBAL_RATE)
+        self._buckets = {}
+        self._queues = {}
+        self._tasks = {}
+        self._dropped = {}
+
+    def send(self, chat_id, text):
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = deque()
+        if len(queue) >= SEND_QUEUE_LIMIT:
+            queue.popleft()
+            self._dropped[chat_id] = self._dropped.get(chat_id, 0) + 1
+        queue.append(text)
+        if chat_id not in self._tasks:
+            self._tasks[chat_id] = asyncio.create_task(self._drain(chat_id))
+
+    def _next_batch(self, queue, chat_id):
+        parts = [queue.popleft()]
+        size = len(parts[0])
+        while queue and size + 1 + len(queue[0]) <= TELEGRAM_MESSAGE_LIMIT:
+            size += 1 + len(queue[0])
+            parts.append(queue.popleft())
+        dropped = self._dropped.pop(chat_id, 0)
+        if dropped:
+            parts.insert(0, f"({dropped} older updates dropped)")
+        return "\n".join(parts)
+
+    async def _throttle(self, chat_id):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(SEND_CHAT_RATE, SEND_CHAT_BURST)
+        await asyncio.sleep(max(bucket.reserve(), self._global.reserve()))
+
+    async def _drain(self, chat_id):
+        queue = self._queues[chat_id]
+        try:
+            while queue:
+                for chunk in split_message(self._next_batch(queue, chat_id)):
+                    await self._throttle(chat_id)
+                    await self._deliver(chat_id, chunk)
+        finally:
+            del self._tasks[chat_id]
+            if not queue:
+                del self._queues[chat_id]
+
+    async def send_now(self, chat_id, text):
+        """Send one message outside the queue and return it, e.g. to edit it later."""
+        await self._throttle(chat_id)
+        return await self._deliver(chat_id, text)
+
+    async def edit(self, chat_id, message_id, text):
+        """Replace the text of a message the bot sent; returns whether it worked."""
+        await self._throttle(chat_id)
+        edited = await self._call(
+            chat_id, functools.partial(self.bot.edit_message_text, text, chat_id=chat_id, message_id=message_id)
+        )
+        if edited is not None:
+            metrics.inc("telegram_messages_edited_total")
+        return edited is not None
+
+    async def pin(self, chat_id, message_id):
+        await self._throttle(chat_id)
+        return await self._call(
+            chat_id, functools.partial(self.bot.pin_chat_message, chat_id, message_id, disable_notification=True)
+        )
+
+    async def _deliver(self, chat_id, text):
+        message = await self._call(chat_id, functools.partial(self.bot.send_message, chat_id, text))
+        if message is not None:
+            metrics.inc("telegram_messages_sent_total")
+        return message
+
+    async def _call(self, chat_id, request, attempts=SEND_RETRIES):
+        for attempt in range(attempts):
+            try:
+                return await request()
+            except RetryAfter as e:
+                metrics.inc("telegram_retry_after_total")
+                delay = e.retry_after
+                await asyncio.sleep(delay.total_seconds() if hasattr(delay, "total_seconds") else delay)
+            # BadRequest subclasses NetworkError but retrying a malformed
+            # message can only fail again, stalling the chat's queue.
+            except BadRequest as e:
+                if "not modified" in str(e):
+                    return True
+                metrics.inc("telegram_messages_failed_total")
+                tg_log.error("Telegram rejected the message to %s: %s", chat_id, e)
+                return None
+            except (TimedOut, NetworkError) as e:
+                tg_log.warning("Telegram send to %s failed (%s), retrying", chat_id, e)
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                metrics.inc("telegram_messages_failed_total")
+                tg_log.error("Could not send message to %s: %s", chat_id, e)
+                return None
+        metrics.inc("telegram_messages_failed_total")
+        tg_log.error("Giving up sending message to %s after %d attempts", chat_id, attempts)
+        return None
+
+    def pending(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+
+
+sender = MessageSender()
+
+
+class ArchiveFile:
+    __slots__ = ("file", "offset", "since_index", "last_used")
+
+    def __init__(self, file, offset):
+        self.file = file
+        self.offset = offset
+        self.since_index = 0
+        self.last_used = time.monotonic()
+
+
+class CommentArchive:
+    """Append-only JSONL archive of every broadcast's comments.
+
+    Comments are written as one compact JSON object per line to
+    ``ARCHIVE_DIR/<telegram user>/<broadcast id>.jsonl`` by a background
+    thread that buffers writes and flushes every ``ARCHIVE_FLUSH_INTERVAL``
+    seconds. Every ``ARCHIVE_INDEX_EVERY`` records the byte offset of the
+    next record is appended to a ``.idx`` file, so exports can be cut on
+    record boundaries without scanning the archive.
+    """
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self._queue = queue.SimpleQueue()
+        self._files = {}
+        self._thread = None
+
+    def path(self, user_id, broadcast_id, suffix=".jsonl"):
+        return os.path.join(self.root, str(user_id), f"{broadcast_id}{suffix}")
+
+    def append(self, user_id, broadcast_id, comments):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="comment-archive", daemon=True)
+            self._thread.start()
+        self._queue.put(("append", (user_id, broadcast_id), comments))
+
+    def close_broadcast(self, user_id, broadcast_id):
+        if self._thread is not None:
+            self._queue.put(("close", (user_id, broadcast_id), None))
+
+    def sync(self):
+        """Block until everything queued so far is on disk."""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(("sync", None, done))
+        done.wait()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(("stop", None, None))
+            self._thread.join()
+            self._thread = None
+
+    def _open(self, key):
+        entry = self._files.get(key)
+        if entry is None:
+            path = self.path(*key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            file = open(path, "ab", buffering=ARCHIVE_BUFFER_BYTES)
+            entry = self._files[key] = ArchiveFile(file, file.tell())
+        entry.last_used = time.monotonic()
+        return entry
+
+    def _write(self, key, comments):
+        entry = self._open(key)
+        index = []
+        for comment in comments:
+            line = json.dumps(comment, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+            entry.file.write(line)
+            entry.offset += len(line)
+            entry.since_index += 1
+            if entry.since_index >= ARCHIVE_INDEX_EVERY:
+                index.append(f"{entry.offset}\n")
+                entry.since_index = 0
+        if index:
+            with open(self.path(*key, suffix=".idx"), "a") as f:
+                f.writelines(index)
+
+    def _close(self, key):
+        entry = self._files.pop(key, None)
+        if entry is not None:
+            entry.file.close()
+
+    def _flush(self):
+        now = time.monotonic()
+        for key, entry in list(self._files.items()):
+            entry.file.flush()
+            if now - entry.last_used > ARCHIVE_IDLE_CLOSE:
+                self._close(key)
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                op, key, payload = self._queue.get(timeout=ARCHIVE_FLUSH_INTERVAL)
+            except queue.Empty:
+                op = None
+            try:
+                if op == "append":
+                    self._write(key, payload)
+                elif op == "close":
+                    self._close(key)
+                elif op == "sync":
+                    self._flush()
+                    payload.set()
+                elif op == "stop":
+                    for key in list(self._files):
+                        self._close(key)
+                    return
+                if time.monotonic() - last_flush >= ARCHIVE_FLUSH_INTERVAL:
+                    self._flush()
+                    last_flush = time.monotonic()
+            except Exception as e:
+                log.error("Comment archive error: %s", e)
+
+    def latest(self, user_id):
+        """Broadcast id of the user's most recently written archive."""
+        directory = os.path.join(self.root, str(user_id))
+        try:
+            names = [n for n in os.listdir(directory) if n.endswith(".jsonl")]
+        except FileNotFoundError:
+            return None
+        if not names:
+            return None
+        latest = max(names, key=lambda n: os.path.getmtime(os.path.join(directory, n)))
+        return latest[:-len(".jsonl")]
+
+    def parts(self, user_id, broadcast_id, part_bytes=EXPORT_PART_BYTES):
+        """Byte ranges of at most ``part_bytes`` (unless a single record is
+        larger) that split the archive on record boundaries."""
+        path = self.path(user_id, broadcast_id)
+        size = os.path.getsize(path)
+        try:
+            with open(self.path(user_id, broadcast_id, suffix=".idx")) as f:
+                boundaries = [int(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            boundaries = []
+        boundaries = [b for b in boundaries if 0 < b < size] + [size]
+        ranges = []
+        start = 0
+        previous = 0
+        for boundary in boundaries:
+            if boundary - start > part_bytes and previous > start:
+                ranges.append((start, previous))
+                start = previous
+            previous = boundary
+        ranges.append((start, size))
+        return ranges
+
+    def read(self, user_id, broadcast_id, start, end):
+        with open(self.path(user_id, broadcast_id), "rb") as f:
+            f.seek(start)
+            return f.read(end - start)
+
+
+archive = CommentArchive()
+
+
+def format_comments(comments):
+    return "\n".join(f"💬 {comment['username']} > {comment['text']}" for comment in comments)
+
+
+# Moderation actions, least to most severe.
+MODERATION_ACTIONS = ("highlight", "hide", "mute")
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton matching any number of keywords in one pass.
+
+    Each keyword carries a severity; scanning a text returns the most
+    severe keyword it contains, in time proportional to the text length
+    whatever the number of keywords. Matching is case-insensitive.
+    """
+
+    def __init__(self, keywords):
+        self._goto = [{}]
+        self._fail = [0]
+        # Best (severity, keyword) ending at each node, including the
+        # suffixes reached through fail links.
+        self._match = [None]
+        for keyword, severity in keywords:
+            keyword = keyword.casefold()
+            if not keyword:
+                continue
+            node = 0
+            for char in keyword:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._match.append(None)
+                node = nxt
+            if self._match[node] is None or severity > self._match[node][0]:
+                self._match[node] = (severity, keyword)
+        self._build_fail_links()
+
+    def _build_fail_links(self):
+        pending = deque(self._goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for char, child in self._goto[node].items():
+                pending.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                inherited = self._match[self._fail[child]]
+                if inherited is not None and (self._match[child] is None or inherited[0] > self._match[child][0]):
+                    self._match[child] = inherited
+
+    def __len__(self):
+        return len(self._goto)
+
+    def search(self, text, stop_at=None):
+        """Return the most severe ``(severity, keyword)`` found in ``text``, or None."""
+        goto, fail, match = self._goto, self._fail, self._match
+        best = None
+        node = 0
+        for char in text.casefold():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            found = match[node]
+            if found is not None and (best is None or found[0] > best[0]):
+                best = found
+                if best[0] == stop_at:
+                    break
+        return best
+
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+_REPEATS = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", None)}
+
+
+def _first_chars(items):
+    """Characters (casefolded) a parsed sequence can start with, or None if it may be anything or empty."""
+    for op, av in items:
+        if op is sre_parse.AT:
+            continue
+        if op is sre_parse.LITERAL:
+            return {chr(av).casefold()}
+        if op is sre_parse.IN and all(item_op is sre_parse.LITERAL for item_op, _ in av):
+            return {chr(char).casefold() for _, char in av}
+        if op is sre_parse.SUBPATTERN:
+            return _first_chars(av[3])
+        if op in _REPEATS and av[0] > 0:
+            return _first_chars(av[2])
+        if op is sre_parse.BRANCH:
+            firsts = [_first_chars(branch) for branch in av[1]]
+            if None in firsts:
+                return None
+            return set().union(*firsts)
+        return None
+    return None
+
+
+def _backtracking_risk(items, repeated=False):
+    """Why a parsed pattern can make the backtracking ``re`` engine take exponential time, or None.
+
+    That happens when a repeated part can match the same text in several
+    ways: a quantifier inside another (``(a+)+``) or alternatives that can
+    start alike (``(a|aa)+``). Backreferences are refused as well.
+    """
+    for op, av in items:
+        if op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            return "backreferences"
+        if op in _REPEATS:
+            low, high, body = av
+            if repeated and high > 1:
+                return "nested quantifiers"
+            reason = _backtracking_risk(body, repeated or high > 1)
+        elif op is sre_parse.BRANCH:
+            branches = av[1]
+            if repeated:
+                firsts = [_first_chars(branch) for branch in branches]
+                if None in firsts or sum(map(len, firsts)) != len(set().union(*firsts)):
+                    return "alternatives that can match alike inside a quantifier"
+            reason = next(filter(None, (_backtracking_risk(branch, repeated) for branch in branches)), None)
+        elif op is sre_parse.SUBPATTERN:
+            reason = _backtracking_risk(av[3], repeated)
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            reason = _backtracking_risk(av[1], repeated)
+        elif op is getattr(sre_parse, "ATOMIC_GROUP", None):
+            reason = _backtracking_risk(av, repeated)
+        else:
+            reason = None
+        if reason:
+            return reason
+    return None
+
+
+def validate_pattern(pattern):
+    """Raise ValueError for a moderation pattern that is too long, risky or invalid."""
+    if not isinstance(pattern, str) or not pattern:
+        raise ValueError(f"pattern {pattern!r} is not a non-empty string")
+    if len(pattern) > MODERATION_MAX_PATTERN_LENGTH:
+        raise ValueError(f"pattern {pattern[:20]!r}... is longer than {MODERATION_MAX_PATTERN_LENGTH} characters")
+    if re.compile(pattern).groupindex:
+        # They would clash with the groups the patterns are combined with.
+        raise ValueError(f"pattern {pattern!r} uses named groups")
+    reason = _backtracking_risk(sre_parse.parse(pattern))
+    if reason:
+        raise ValueError(f"pattern {pattern!r} uses {reason}")
+
+
+class ModerationRules:
+    """A compiled, immutable rule set.
+
+    Built from a JSON document mapping each action of
+    ``MODERATION_ACTIONS`` to ``keywords``, ``patterns`` (regular
+    expressions) and ``users`` lists. All keywords go into one automaton,
+    all patterns into one alternation and blocked users into a set, so a
+    comment is scanned once per kind of rule however many rules there are.
+    """
+
+    def __init__(self, data, version=0.0):
+        self.version = version
+        keywords = []
+        patterns = []
+        self._users = {}
+        self._check_structure(data)
+        count = sum(len(data.get(action, {}).get("patterns", [])) for action in MODERATION_ACTIONS)
+        if count > MODERATION_MAX_PATTERNS:
+            raise ValueError(f"{count} patterns, at most {MODERATION_MAX_PATTERNS} are allowed")
+        for severity, action in enumerate(MODERATION_ACTIONS):
+            rules = data.get(action, {})
+            keywords.extend((keyword, severity) for keyword in rules.get("keywords", []))
+            for pattern in rules.get("patterns", []):
+                validate_pattern(pattern)
+            if rules.get("patterns"):
+                alternatives = "|".join(f"(?:{pattern})" for pattern in rules["patterns"])
+                patterns.append(f"(?P<s{severity}>{alternatives})")
+            for username in rules.get("users", []):
+                username = username.casefold()
+                self._users[username] = max(severity, self._users.get(username, severity))
+        # Most severe first, inside a lookahead so every position is tried
+        # and a match never hides an overlapping, more severe one.
+        patterns.reverse()
+        self._patterns = re.compile(f"(?=(?:{'|'.join(patterns)}))", re.IGNORECASE) if patterns else None
+        self._keywords = KeywordAutomaton(keywords)
+
+    @staticmethod
+    def _check_structure(data):
+        if not isinstance(data, dict):
+            raise ValueError("the rules must be a JSON object")
+        for action, rules in data.items():
+            if action not in MODERATION_ACTIONS:
+                raise ValueError(f"unknown action {action!r}, expected one of {', '.join(MODERATION_ACTIONS)}")
+            if not isinstance(rules, dict):
+                raise ValueError(f"{action} must be an object with keywords, patterns and users lists")
+            for kind, values in rules.items():
+                if kind not in ("keywords", "patterns", "users"):
+                    raise ValueError(f"unknown rule kind {kind!r} in {action}")
+                if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+                    raise ValueError(f"{action}.{kind} must be a list of strings")
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data, version=os.stat(path).st_mtime)
+
+    def check(self, comment):
+        """Return ``(action, reason)`` for a comment that matches a rule, else None."""
+        top = len(MODERATION_ACTIONS) - 1
+        best = None
+        severity = self._users.get(comment["username"].casefold())
+        if severity is not None:
+            best = (severity, "blocked user")
+        if best is None or best[0] < top:
+            found = self._keywords.search(comment["text"], stop_at=top)
+            if found is not None and (best is None or found[0] > best[0]):
+                best = (found[0], f"keyword \"{found[1]}\"")
+        if self._patterns is not None and (best is None or best[0] < top):
+            for match in self._patterns.finditer(comment["text"]):
+                severity = int(match.lastgroup[1:])
+                if best is None or severity > best[0]:
+                    best = (severity, "pattern")
+                    if severity == top:
+                        break
+        if best is None:
             return None
+        return MODERATION_ACTIONS[best[0]], best[1]
 
-    def get_comments(self):
+
+class Moderator:
+    """Holds the current rule set and reloads it when ``MODERATION_RULES`` changes.
+
+    The file's mtime is polled every ``MODERATION_RELOAD_INTERVAL`` seconds.
+    A changed file is compiled in a worker thread and then swapped in as a
+    whole, so comments keep flowing through the previous rules meanwhile.
+    A file that fails to compile leaves the previous rules in place.
+    """
+
+    def __init__(self, path=MODERATION_RULES):
+        self.path = path
+        self.rules = None
+        self._rejected = None
+        self._task = None
+
+    def check(self, comment):
+        rules = self.rules
+        if rules is None:
+            return None
+        return rules.check(comment)
+
+    async def reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            log.warning("Cannot read moderation rules %s: %s", self.path, e)
+            return
+        if mtime == self._rejected or (self.rules is not None and self.rules.version == mtime):
+            return
+        started = time.perf_counter()
         try:
-            response = self.client.private_request(f"live/{self.broadcast_id}/get_comment/")
-            if 'comments' in response:
-                return [{"username": c["user"]["username"], "text": c["text"]} for c in response['comments']]
+            rules = await asyncio.to_thread(ModerationRules.load, self.path)
+        except (OSError, ValueError, re.error) as e:
+            log.error("Invalid moderation rules in %s, keeping the previous ones: %s", self.path, e)
+            # Don't retry the same broken file every interval.
+            self._rejected = mtime
+            return
+        self.rules = rules
+        metrics.observe("moderation_reload_seconds", time.perf_counter() - started)
+        log.info("Loaded moderation rules from %s (%d automaton states)", self.path, len(rules._keywords))
+
+    def start(self):
+        self._task = asyncio.create_task(self._watch())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _watch(self):
+        while True:
+            try:
+                await self.reload()
+            except Exception as e:
+                log.error("Could not reload moderation rules from %s: %s", self.path, e, exc_info=e)
+            await asyncio.sleep(MODERATION_RELOAD_INTERVAL)
+
+
+moderator = Moderator()
+
+
+class CommentPoller:
+    """Tracks the new comments of one broadcast.
+
+    Each poll asks Instagram only for comments newer than the last seen
+    ``created_at`` timestamp and drops anything already delivered, keeping
+    the most recent comment pks in a bounded set. Comments only count as
+    seen once ``deliver`` has handled them, so a poll whose result is
+    dropped asks for them again.
+    """
+
+    def __init__(self, user_id, chat_id, ig_live, max_seen=COMMENT_SEEN_LIMIT):
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.ig_live = ig_live
+        self.max_seen = max_seen
+        self.last_comment_ts = 0
+        self.muted = set()
+        self.dashboard = None
+        self._seen = OrderedDict()
+
+    def _filter_new(self, comments):
+        new = {}
+        for comment in comments:
+            if comment["pk"] not in self._seen:
+                new.setdefault(comment["pk"], comment)
+        return list(new.values())
+
+    def _mark_seen(self, comments):
+        for comment in comments:
+            self._seen[comment["pk"]] = None
+            if len(self._seen) > self.max_seen:
+                self._seen.popitem(last=False)
+            if comment["created_at"] > self.last_comment_ts:
+                self.last_comment_ts = comment["created_at"]
+
+    async def poll(self):
+        comments = await self.ig_live.get_comments(self.last_comment_ts)
+        if not comments:
             return []
+        return self._filter_new(comments)
+
+    def moderate(self, comments):
+        """Apply the moderation rules, returning the visible and the highlighted comments.
+
+        Flagged comments are annotated with a ``moderation`` entry, which
+        ends up in the archive.
+        """
+        visible = []
+        highlighted = []
+        for comment in comments:
+            if comment["username"] in self.muted:
+                comment["moderation"] = "muted"
+                continue
+            verdict = moderator.check(comment)
+            if verdict is None:
+                visible.append(comment)
+                continue
+            action, reason = verdict
+            comment["moderation"] = action
+            metrics.inc("moderation_actions_total", (("action", action),))
+            if action == "highlight":
+                highlighted.append((comment, reason))
+            elif action == "mute":
+                self.muted.add(comment["username"])
+                sender.send(self.chat_id, f"🔇 {comment['username']} muted for this live ({reason}).")
+        return visible, highlighted
+
+    async def deliver(self, comments):
+        if not comments:
+            return
+        self._deliver(comments)
+        self._mark_seen(comments)
+
+    def _deliver(self, comments):
+        visible, highlighted = self.moderate(comments)
+        archive.append(self.user_id, self.ig_live.broadcast_id, comments)
+        if highlighted:
+            lines = [f"🚩 {comment['username']} > {comment['text']} ({reason})" for comment, reason in highlighted]
+            sender.send(self.chat_id, "**Flagged:**\n" + "\n".join(lines))
+        if not visible:
+            return
+        if self.dashboard is not None:
+            self.dashboard.add_comments(visible)
+        else:
+            sender.send(self.chat_id, f"**Comments:**\n{format_comments(visible)}")
+
+
+class TimerWheel:
+    """Hashed timer wheel driving every poll timer from a single asyncio task.
+
+    Scheduling is O(1) regardless of how many broadcasts are being polled;
+    each tick only looks at the timers of one slot.
+    """
+
+    def __init__(self, tick=POLL_TICK, slots=POLL_WHEEL_SLOTS):
+        self.tick = tick
+        self.slots = slots
+        self._wheel = [[] for _ in range(slots)]
+        self._cursor = 0
+        self._task = None
+
+    def schedule(self, delay, callback):
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self._cursor + ticks) % self.slots
+        self._wheel[slot].append([(ticks - 1) // self.slots, callback])
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += self.tick
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            self._cursor = (self._cursor + 1) % self.slots
+            due = []
+            pending = []
+            for entry in self._wheel[self._cursor]:
+                if entry[0] == 0:
+                    due.append(entry[1])
+                else:
+                    entry[0] -= 1
+                    pending.append(entry)
+            self._wheel[self._cursor] = pending
+            for callback in due:
+                try:
+                    callback()
+                except Exception as e:
+                    poll_log.exception("Timer callback failed: %s", e)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class SnapshotCache:
+    """Per-broadcast cache of one Instagram resource.
+
+    Values younger than ``ttl`` are served from memory. Older values are
+    still served immediately while a single background request refreshes
+    them (stale-while-revalidate), up to ``stale_ttl``; past that callers
+    wait for the refresh. Concurrent refreshes share one in-flight request.
+    """
+
+    def __init__(self, fetch, ttl, stale_ttl=CACHE_STALE_TTL):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.stale_ttl = max(ttl, stale_ttl)
+        self.value = None
+        self.updated_at = 0.0
+        self._inflight = None
+
+    def age(self):
+        return asyncio.get_running_loop().time() - self.updated_at
+
+    async def refresh(self):
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._fetch())
+        return await asyncio.shield(self._inflight)
+
+    async def get(self):
+        if self.updated_at:
+            age = self.age()
+            if age < self.ttl:
+                return self.value
+            if age < self.stale_ttl:
+                if self._inflight is None:
+                    spawn(self._revalidate())
+                return self.value
+        return await self.refresh()
+
+    async def _revalidate(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            poll_log.error("Error refreshing cached snapshot: %s", e)
+
+    async def _fetch(self):
+        try:
+            self.value = await self.fetch()
+            self.updated_at = asyncio.get_running_loop().time()
+            return self.value
+        finally:
+            self._inflight = None
+
+
+class PollJob(SnapshotCache):
+    """A cached resource of a broadcast that the scheduler keeps refreshing.
+
+    The poll interval shrinks to ``min_interval`` while the resource is
+    changing, backs off towards ``max_interval`` while it is idle, and jumps
+    to ``POLL_THROTTLE_INTERVAL`` when Instagram throttles the account.
+    """
+
+    def __init__(self, name, fetch, min_interval, on_result=None, is_busy=None, ttl=0.0):
+        super().__init__(fetch, ttl)
+        self.name = name
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, POLL_MAX_INTERVAL)
+        self.interval = min_interval
+        self.on_result = on_result
+        self.is_busy = is_busy
+        self.active = True
+
+    async def _fetch(self):
+        try:
+            try:
+                value = await self.fetch()
+            except Exception as e:
+                # The fetch already logged it; keep serving the last value.
+                if is_throttle_error(e):
+                    self.interval = max(self.max_interval, POLL_THROTTLE_INTERVAL)
+                else:
+                    self.interval = min(self.interval * 2, self.max_interval)
+                return self.value
+            busy = self.is_busy(value) if self.is_busy else value != self.value
+            if busy:
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * POLL_BACKOFF, self.max_interval)
+            self.value = value
+            self.updated_at = asyncio.get_running_loop().time()
+            if self.on_result:
+                await self.on_result(value)
+            return value
+        finally:
+            self._inflight = None
+
+
+class PollScheduler:
+    """Polls every active broadcast on a shared timer wheel."""
+
+    def __init__(self, wheel=None):
+        self.wheel = wheel or TimerWheel()
+
+    def add(self, job):
+        self.wheel.schedule(job.interval, functools.partial(self._fire, job))
+
+    def _fire(self, job):
+        if not job.active:
+            return
+        if job.updated_at and job.age() < job.interval / 2:
+            # A button press refreshed it recently, no need to ask again yet.
+            self.add(job)
+            return
+        spawn(self._poll(job))
+
+    async def _poll(self, job):
+        try:
+            await job.refresh()
         except Exception as e:
-            logging.error(f"Error retrieving comments: {e}")
+            poll_log.error("Error polling %s: %s", job.name, e)
+        if job.active:
+            self.add(job)
+
+    def stop(self):
+        self.wheel.stop()
+
+
+poll_scheduler = PollScheduler()
+
+
+class ViewerRecord:
+    __slots__ = ("username", "first_seen", "last_seen", "watch_time", "present")
+
+    def __init__(self, username, now):
+        self.username = username
+        self.first_seen = now
+        self.last_seen = now
+        self.watch_time = 0.0
+        self.present = True
+
+
+class ViewerTracker:
+    """Viewer presence of one broadcast, diffed between successive viewer lists.
+
+    Joins and leaves are set differences on viewer pks. They accumulate until
+    the operator is shown them with ``take_delta``; a viewer who joins and
+    leaves again in between cancels out.
+    """
+
+    def __init__(self):
+        self.viewers = {}
+        self.present = set()
+        self._joined = {}
+        self._left = {}
+
+    def update(self, users, ids, now=None):
+        now = now or time.time()
+        current = dict(zip(ids, users))
+        current_pks = current.keys()
+        joined = current_pks - self.present
+        left = self.present - current_pks
+        for pk in self.present & current_pks:
+            record = self.viewers[pk]
+            record.watch_time += now - record.last_seen
+            record.last_seen = now
+        for pk in joined:
+            record = self.viewers.get(pk)
+            if record is None:
+                record = self.viewers[pk] = ViewerRecord(current[pk], now)
+            record.username = current[pk]
+            record.last_seen = now
+            record.present = True
+            if self._left.pop(pk, False) is False:
+                self._joined[pk] = None
+        for pk in left:
+            self.viewers[pk].present = False
+            if self._joined.pop(pk, False) is False:
+                self._left[pk] = None
+        self.present = set(current_pks)
+        return joined, left
+
+    def take_delta(self):
+        joined = [self.viewers[pk].username for pk in self._joined]
+        left = [self.viewers[pk].username for pk in self._left]
+        self._joined.clear()
+        self._left.clear()
+        return joined, left
+
+
+class LiveMonitor:
+    """Polled state of one broadcast: live info, new comments and viewers."""
+
+    def __init__(self, user_id, chat_id, ig_live):
+        self.ig_live = ig_live
+        self.comments = CommentPoller(user_id, chat_id, ig_live)
+        self.viewers = ViewerTracker()
+        self.dashboard = None
+        self.jobs = {
+            "info": PollJob("info", ig_live.live_info, INFO_POLL_INTERVAL, ttl=INFO_CACHE_TTL),
+            "comments": PollJob(
+                "comments", self.comments.poll, COMMENT_POLL_INTERVAL,
+                on_result=self.comments.deliver, is_busy=bool,
+            ),
+            "viewers": PollJob(
+                "viewers", ig_live.get_viewer_list, VIEWER_POLL_INTERVAL, on_result=self._track_viewers,
+                ttl=VIEWER_CACHE_TTL,
+            ),
+        }
+
+    async def _track_viewers(self, value):
+        users, ids = value
+        joined, left = self.viewers.update(users, ids)
+        if self.dashboard is not None:
+            self.dashboard.add_activity(
+                [self.viewers.viewers[pk].username for pk in joined],
+                [self.viewers.viewers[pk].username for pk in left],
+            )
+
+    async def _on_info(self, value):
+        self.dashboard.touch()
+
+    def attach(self, dashboard):
+        """Feed the polled state to ``dashboard`` instead of separate messages."""
+        self.dashboard = dashboard
+        self.comments.dashboard = dashboard
+        self.jobs["info"].on_result = self._on_info
+
+    def start(self):
+        for job in self.jobs.values():
+            poll_scheduler.add(job)
+
+    def stop(self):
+        for job in self.jobs.values():
+            job.active = False
+
+
+class Dashboard:
+    """A pinned message per broadcast, edited in place with its current state.
+
+    Every poll result marks the dashboard dirty; at most one edit per
+    ``DASHBOARD_REFRESH`` seconds is sent, and none when the rendered text
+    is the same as what is already shown.
+    """
+
+    def __init__(self, live):
+        self.live = live
+        self.message_id = None
+        self.comments = deque(maxlen=DASHBOARD_COMMENTS)
+        self.activity = deque(maxlen=DASHBOARD_ACTIVITY)
+        self._digest = None
+        self._edited_at = 0.0
+        self._pending = None
+
+    def render(self, ended=False):
+        live = self.live
+        info = live.monitor.jobs["info"].value or {}
+        viewers = live.monitor.viewers
+        status = "ended" if ended else info.get("status", "starting")
+        lines = [
+            f"📡 {live.title}",
+            f"Status: {status} | 👀 {info.get('viewer_count', len(viewers.present))} viewers",
+        ]
+        if live.relay and not ended:
+            lines.append(live.relay.describe())
+        if self.activity:
+            lines.append("")
+            lines.extend(self.activity)
+        if self.comments:
+            lines.append("")
+            lines.append(format_comments(self.comments))
+        return "\n".join(lines)[:TELEGRAM_MESSAGE_LIMIT]
+
+    async def open(self):
+        text = self.render()
+        message = await sender.send_now(self.live.chat_id, text)
+        if message is None:
+            return
+        self.message_id = message.message_id
+        self._digest = hash(text)
+        self._edited_at = time.monotonic()
+        await sender.pin(self.live.chat_id, self.message_id)
+
+    def add_comments(self, comments):
+        for comment in comments:
+            self.comments.append({"username": comment["username"], "text": comment["text"][:200]})
+        self.touch()
+
+    def add_activity(self, joined, left):
+        if not joined and not left:
+            return
+        summary = []
+        if joined:
+            summary.append(f"👤 {', '.join(joined[:3])}" + (f" +{len(joined) - 3}" if len(joined) > 3 else "") + " joined")
+        if left:
+            summary.append(f"👋 {', '.join(left[:3])}" + (f" +{len(left) - 3}" if len(left) > 3 else "") + " left")
+        self.activity.append(", ".join(summary))
+        self.touch()
+
+    def touch(self):
+        """Schedule an edit, no sooner than ``DASHBOARD_REFRESH`` after the last one."""
+        if self.message_id is None or self._pending is not None:
+            return
+        delay = max(0.0, self._edited_at + DASHBOARD_REFRESH - time.monotonic())
+        self._pending = asyncio.create_task(self._flush(delay))
+
+    async def _flush(self, delay, ended=False):
+        await asyncio.sleep(delay)
+        self._pending = None
+        text = self.render(ended)
+        digest = hash(text)
+        if digest == self._digest:
+            metrics.inc("dashboard_edits_skipped_total")
+            return
+        self._edited_at = time.monotonic()
+        if await sender.edit(self.live.chat_id, self.message_id, text):
+            self._digest = digest
+
+    def close(self):
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+        if self.message_id is not None:
+            spawn(self._flush(0, ended=True))
+
+
+class RelaySupervisor:
+    """Supervises an ffmpeg relay for one broadcast.
+
+    ffmpeg listens for the operator's encoder on a local RTMP (or SRT) port
+    and copies the stream, without re-encoding, to the Instagram ingest
+    endpoint and any ``RELAY_DESTINATIONS``. When the process exits (the
+    encoder dropped, Instagram closed the connection) or stops reporting
+    progress it is restarted with backoff until the broadcast ends. The
+    ``-progress`` output provides the frame, fps and bitrate stats.
+    """
+
+    _free_ports = None
+
+    def __init__(self, destination):
+        self.destination = destination
+        self.ingest_key = secrets.token_urlsafe(12)
+        self.port = self._allocate_port()
+        self.state = "starting"
+        self.restarts = 0
+        self.stats = {}
+        self.errors = deque(maxlen=5)
+        self._process = None
+        self._task = None
+        self._stopped = False
+
+    @classmethod
+    def _allocate_port(cls):
+        if cls._free_ports is None:
+            cls._free_ports = deque(range(RELAY_PORT_BASE, RELAY_PORT_BASE + RELAY_PORT_COUNT))
+        if not cls._free_ports:
+            raise RuntimeError("No free relay ports left.")
+        return cls._free_ports.popleft()
+
+    @property
+    def ingest_url(self):
+        if RELAY_PROTOCOL == "srt":
+            return f"srt://{RELAY_PUBLIC_HOST}:{self.port}?streamid={self.ingest_key}"
+        return f"rtmp://{RELAY_PUBLIC_HOST}:{self.port}/live/{self.ingest_key}"
+
+    def _command(self):
+        if RELAY_PROTOCOL == "srt":
+            source = ["-i", f"srt://{RELAY_LISTEN_HOST}:{self.port}?mode=listener&streamid={self.ingest_key}"]
+        else:
+            source = ["-listen", "1", "-i", f"rtmp://{RELAY_LISTEN_HOST}:{self.port}/live/{self.ingest_key}"]
+        # Losing Instagram aborts the relay so it gets restarted; extra
+        # destinations are best effort.
+        outputs = [f"[f=flv]{self.destination}"]
+        outputs += [f"[f=flv:onfail=ignore]{url}" for url in RELAY_DESTINATIONS]
+        return [
+            FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-nostats", "-progress", "pipe:1",
+            *source, "-map", "0", "-c", "copy", "-f", "tee", "|".join(outputs),
+        ]
+
+    def start(self):
+        self._task = asyncio.create_task(self._supervise())
+
+    async def _supervise(self):
+        delay = RELAY_RESTART_DELAY
+        while not self._stopped:
+            started = time.monotonic()
+            try:
+                await self._run_once()
+            except Exception as e:
+                self.errors.append(str(e))
+                log.error("Relay on port %d failed: %s", self.port, e)
+            if self._stopped:
+                break
+            self.restarts += 1
+            self.state = "restarting"
+            metrics.inc("relay_restarts_total")
+            if time.monotonic() - started > RELAY_STABLE_AFTER:
+                delay = RELAY_RESTART_DELAY
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RELAY_RESTART_MAX_DELAY)
+        self.state = "stopped"
+
+    async def _run_once(self):
+        self._process = await asyncio.create_subprocess_exec(
+            *self._command(), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        self.state = "listening"
+        stderr_task = asyncio.create_task(self._collect_errors(self._process.stderr))
+        try:
+            while True:
+                # Once media flows, silence means a stalled relay.
+                timeout = RELAY_STALL_TIMEOUT if self.state == "streaming" else None
+                try:
+                    line = await asyncio.wait_for(self._process.stdout.readline(), timeout)
+                except asyncio.TimeoutError:
+                    self.errors.append("stalled, no progress reported")
+                    self._process.kill()
+                    break
+                if not line:
+                    break
+                key, _, value = line.decode(errors="replace").strip().partition("=")
+                if key == "progress":
+                    self.state = "streaming" if value == "continue" else "listening"
+                    self.stats["updated_at"] = time.time()
+                elif key in ("frame", "fps", "bitrate", "total_size", "out_time", "speed", "drop_frames"):
+                    self.stats[key] = value
+        finally:
+            await self._process.wait()
+            await stderr_task
+
+    async def _collect_errors(self, stream):
+        while True:
+            line = await stream.readline()
+            if not line:
+                return
+            self.errors.append(line.decode(errors="replace").strip())
+
+    def describe(self):
+        lines = [f"- Relay: {self.state} (restarts: {self.restarts})"]
+        if self.stats:
+            lines.append(
+                f"- Relay Stats: {self.stats.get('fps', '?')} fps, {self.stats.get('bitrate', '?')}, "
+                f"{self.stats.get('frame', '?')} frames, {self.stats.get('drop_frames', '0')} dropped"
+            )
+        if self.errors and self.state != "streaming":
+            lines.append(f"- Relay Error: {self.errors[-1]}")
+        return "\n".join(lines)
+
+    def stop(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        self.state = "stopped"
+        if self._process is not None and self._process.returncode is None:
+            # Let _run_once reap the process; it exits the loop afterwards.
+            self._process.terminate()
+        elif self._task is not None:
+            self._task.cancel()
+        self._free_ports.append(self.port)
+
+
+class Broadcast:
+    """One live broadcast of an Instagram account, driven by a Telegram user."""
+
+    def __init__(self, user_id, account, chat_id, ig_live, title):
+        self.user_id = user_id
+        self.account = account
+        self.chat_id = chat_id
+        self.ig_live = ig_live
+        self.title = title
+        self.state = BROADCAST_CREATED
+        self.monitor = None
+        self.relay = None
+        self.dashboard = None
+        self.created_at = time.time()
+
+    @property
+    def key(self):
+        return self.user_id, self.account
+
+    @property
+    def broadcast_id(self):
+        return self.ig_live.broadcast_id
+
+
+class BroadcastRegistry:
+    """Every broadcast that has not ended yet, indexed for O(1) lookup by
+    Telegram user, by (Telegram user, Instagram account) and by broadcast id."""
+
+    def __init__(self):
+        self._by_key = {}
+        self._by_user = {}
+        self._by_id = {}
+
+    def __len__(self):
+        return len(self._by_key)
+
+    def __iter__(self):
+        return iter(list(self._by_key.values()))
+
+    def add(self, broadcast):
+        if broadcast.user_id in self._by_user:
+            raise ValueError(f"User {broadcast.user_id} already has a live running.")
+        self._by_key[broadcast.key] = broadcast
+        self._by_user[broadcast.user_id] = broadcast
+
+    def get(self, user_id):
+        return self._by_user.get(user_id)
+
+    def get_by_account(self, user_id, account):
+        return self._by_key.get((user_id, account))
+
+    def get_by_id(self, broadcast_id):
+        return self._by_id.get(broadcast_id)
+
+    def mark_started(self, broadcast):
+        broadcast.state = BROADCAST_STARTED
+        self._by_id[broadcast.broadcast_id] = broadcast
+
+    def mark_ended(self, broadcast):
+        broadcast.state = BROADCAST_ENDED
+        if broadcast.monitor:
+            broadcast.monitor.stop()
+        if broadcast.relay:
+            broadcast.relay.stop()
+        if broadcast.dashboard:
+            broadcast.dashboard.close()
+        if broadcast.broadcast_id is not None:
+            archive.close_broadcast(broadcast.user_id, broadcast.broadcast_id)
+        self._by_key.pop(broadcast.key, None)
+        self._by_id.pop(broadcast.broadcast_id, None)
+        if self._by_user.get(broadcast.user_id) is broadcast:
+            del self._by_user[broadcast.user_id]
+
+
+broadcasts = BroadcastRegistry()
+
+
+class SessionStore:
+    """Instagram sessions persisted in a single SQLite file.
+
+    Each row holds the instagrapi settings of one Instagram account, the
+    Telegram user that saved it and when it was last verified against
+    Instagram. The database is opened lazily on first use.
+    """
+
+    def __init__(self, path=SESSION_DB):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "username TEXT PRIMARY KEY, "
+                "tg_user_id INTEGER NOT NULL, "
+                "settings TEXT NOT NULL, "
+                "verified_at REAL NOT NULL DEFAULT 0, "
+                "updated_at REAL NOT NULL, "
+                "ephemeral INTEGER NOT NULL DEFAULT 0)"
+            )
+            try:
+                self._conn.execute("ALTER TABLE sessions ADD COLUMN ephemeral INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_tg_user ON sessions (tg_user_id)")
+        return self._conn
+
+    def save(self, username, tg_user_id, settings, verified_at=0.0, ephemeral=False):
+        """Store a session. Ephemeral rows only park evicted clients and are
+        purged on startup; saving never downgrades a kept session to ephemeral."""
+        with self._lock:
+            self._db().execute(
+                "INSERT INTO sessions (username, tg_user_id, settings, verified_at, updated_at, ephemeral) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (username) DO UPDATE SET "
+                "tg_user_id = excluded.tg_user_id, "
+                "settings = excluded.settings, "
+                "verified_at = MAX(sessions.verified_at, excluded.verified_at), "
+                "updated_at = excluded.updated_at, "
+                "ephemeral = MIN(sessions.ephemeral, excluded.ephemeral)",
+                (username, tg_user_id, json.dumps(settings), verified_at, time.time(), int(ephemeral)),
+            )
+
+    def load(self, username, tg_user_id):
+        """Return ``(settings, verified_at)`` if ``tg_user_id`` saved a session for ``username``."""
+        with self._lock:
+            row = self._db().execute(
+                "SELECT settings, verified_at FROM sessions WHERE username = ? AND tg_user_id = ?",
+                (username, tg_user_id),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def load_for_user(self, tg_user_id):
+        """Return ``(username, settings, verified_at)`` of the user's most recent session."""
+        with self._lock:
+            row = self._db().execute(
+                "SELECT username, settings, verified_at FROM sessions WHERE tg_user_id = ? "
+                "ORDER BY updated_at DESC LIMIT 1",
+                (tg_user_id,),
+            ).fetchone()
+        if row is None:
             return None
+        return row[0], json.loads(row[1]), row[2]
+
+    def stale(self, verified_before, limit):
+        """Return ``(username, tg_user_id)`` of sessions last verified before ``verified_before``, oldest first."""
+        with self._lock:
+            return self._db().execute(
+                "SELECT username, tg_user_id FROM sessions WHERE verified_at < ? ORDER BY verified_at LIMIT ?",
+                (verified_before, limit),
+            ).fetchall()
+
+    def mark_verified(self, username, verified_at=None):
+        with self._lock:
+            self._db().execute(
+                "UPDATE sessions SET verified_at = ? WHERE username = ?",
+                (verified_at or time.time(), username),
+            )
 
-    def get_viewer_list(self):
+    def delete(self, username):
+        with self._lock:
+            self._db().execute("DELETE FROM sessions WHERE username = ?", (username,))
+
+    def purge_ephemeral(self):
+        with self._lock:
+            self._db().execute("DELETE FROM sessions WHERE ephemeral = 1")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+session_store = SessionStore()
+
+
+class ClientPool:
+    """Resident instagrapi Clients keyed by Telegram user id.
+
+    At most ``max_clients`` stay in memory. When the cap is exceeded the
+    least recently used idle clients (no live running, no request in flight)
+    are parked in the session store and rebuilt by ``get_client`` on their
+    next use.
+    """
+
+    def __init__(self, max_clients=MAX_RESIDENT_CLIENTS):
+        self.max_clients = max_clients
+        self._clients = OrderedDict()
+        # Sessions being written to the store, still readable by get_client.
+        self.parking = {}
+
+    def __len__(self):
+        return len(self._clients)
+
+    def __contains__(self, user_id):
+        return user_id in self._clients
+
+    def get(self, user_id, default=None):
+        cl = self._clients.get(user_id)
+        if cl is None:
+            return default
+        self._clients.move_to_end(user_id)
+        return cl
+
+    def __setitem__(self, user_id, cl):
+        self._clients[user_id] = cl
+        self._clients.move_to_end(user_id)
+        self._evict()
+
+    def pop(self, user_id, default=None):
+        return self._clients.pop(user_id, default)
+
+    def _is_idle(self, user_id):
+        return broadcasts.get(user_id) is None and user_id not in prewarmed and not ig_executor.busy(user_id)
+
+    def _evict(self):
+        excess = len(self._clients) - self.max_clients
+        for user_id in list(self._clients):
+            if excess <= 0:
+                break
+            if self._is_idle(user_id):
+                self._park(user_id)
+                excess -= 1
+
+    def _park(self, user_id):
+        cl = self._clients.pop(user_id)
+        username = getattr(cl, "username", None)
+        if username:
+            parked = self.parking[user_id] = (username, cl.get_settings(), 0.0)
+            spawn(self._save_parked(user_id, parked))
+        ig_executor.forget(user_id)
+
+    async def _save_parked(self, user_id, parked):
+        username, settings, _ = parked
         try:
-            response = self.client.private_request(f"live/{self.broadcast_id}/get_viewer_list/")
-            users = []
-            ids = []
-            for user in response.get('users', []):
-                users.append(user['username'])
-                ids.append(user['pk'])
-            logging.debug(f"Viewer list retrieved: {users}")
-            return users, ids
+            await asyncio.to_thread(session_store.save, username, user_id, settings, ephemeral=True)
         except Exception as e:
-            logging.warning(f"Failed to retrieve viewer list: {e}")
-            return [], []
+            log.error("Could not park the session of %s: %s", username, e)
+        finally:
+            if self.parking.get(user_id) is parked:
+                del self.parking[user_id]
+
 
+cl_dict = ClientPool()
 
-def login_instagram(username, password=None, verification_code=None, session_file=None):
-    cl = Client()
 
-    if session_file and os.path.exists(session_file):
+# Settings a new login inherits from the client template; everything else
+# (uuids, cookies, authorization) is generated or obtained per account.
+CLIENT_TEMPLATE_KEYS = ("device_settings", "user_agent", "country", "country_code", "locale", "timezone_offset")
+_client_template = None
+
+
+def client_template():
+    """Device settings and user agent shared by new logins, as JSON.
+
+    Read from ``IG_CLIENT_TEMPLATE`` if set, otherwise taken from the
+    defaults of a Client built on first use.
+    """
+    global _client_template
+    if _client_template is None:
+        if IG_CLIENT_TEMPLATE:
+            with open(IG_CLIENT_TEMPLATE) as f:
+                settings = json.load(f)
+        else:
+            settings = instagrapi.Client().get_settings()
+        _client_template = json.dumps({key: settings[key] for key in CLIENT_TEMPLATE_KEYS if key in settings})
+    return _client_template
+
+
+def new_client(settings=None):
+    """Build a Client from stored session settings, or from the template for a new login.
+
+    Settings are passed to the constructor, which applies them once,
+    instead of initializing defaults and then calling ``set_settings``.
+    """
+    if settings is None:
+        # Fresh uuids are generated for every client since the template has none.
+        settings = json.loads(client_template())
+    return instagrapi.Client(settings)
+
+
+async def login_instagram(user_id, username, password=None, verification_code=None, session=None):
+    account = account_key(username)
+    if session:
+        settings, verified_at = session
         try:
-            cl.load_settings(session_file)
+            cl = await ig_executor.run(user_id, new_client, settings)
             if not cl.user_id:
-                raise Exception("Saved session not valid.")
-            else:
-                cl.user_info_v1(cl.user_id)
-                print("Session loaded successfully!")
-                return cl
+                raise ig_errors.LoginRequired("Saved session not valid.")
+            cl.username = cl.username or username
+            # A recently verified session is trusted as is, skipping the
+            # validation round trip.
+            if time.time() - verified_at > SESSION_VERIFY_TTL:
+                await governor.run(
+                    user_id, account, "login/verify", functools.partial(cl.user_info_v1, cl.user_id)
+                )
+                await asyncio.to_thread(session_store.mark_verified, username)
+            log.info("Session of %s loaded successfully", username)
+            return cl
         except Exception as e:
-            print("Error loading session:", e)
-            os.remove(session_file)
+            if not is_session_error(e):
+                # Refused by the governor, throttled or a network error: the
+                # session may well be valid, so keep it for the next attempt.
+                log.warning("Could not verify the session of %s: %s", username, e)
+                raise
+            log.warning("Error loading the session of %s: %s", username, e)
+            await asyncio.to_thread(session_store.delete, username)
 
     if not password:
         raise ValueError("No password provided.")
 
+    cl = await ig_executor.run(user_id, new_client)
+
     try:
-        success = cl.login(
+        # Timeouts and connection errors are retried with backoff; a throttle
+        # fails the login at once (see below).
+        success = await governor.run(user_id, account, "login", functools.partial(
+            cl.login,
             username=username,
             password=password,
             verification_code=verification_code or ""
-        )
+        ))
         if success:
-            print("Login successful!")
+            log.info("Login of %s successful", username)
             return cl
         else:
-            print("Login failed with no specific error from instagrapi.")
+            log.warning("Login of %s failed with no specific error from instagrapi", username)
             return None
 
-    except TwoFactorRequired:
-        raise TwoFactorRequired("two_factor_required")
+    except ig_errors.TwoFactorRequired:
+        raise ig_errors.TwoFactorRequired("two_factor_required")
 
-    except ChallengeRequired:
-        raise ChallengeRequired("challenge_required")
+    except ig_errors.ChallengeRequired:
+        raise ig_errors.ChallengeRequired("challenge_required")
 
-    except (BadCredentials, ReloginAttemptExceeded) as e:
-        print(f"Bad credentials or too many relogin attempts: {e}")
+    except (ig_errors.BadCredentials, ig_errors.ReloginAttemptExceeded) as e:
+        log.warning("Bad credentials or too many relogin attempts for %s: %s", username, e)
         return None
 
-    except (PleaseWaitFewMinutes, ClientThrottledError) as e:
-        print(f"Instagram is throttling us: {e}")
+    except (ig_errors.PleaseWaitFewMinutes, ig_errors.ClientThrottledError) as e:
+        log.warning("Instagram is throttling the login of %s: %s", username, e)
         return None
 
     except Exception as e:
-        print(f"Error logging in: {e}")
+        log.error("Error logging in %s: %s", username, e)
         return None
 
 
+def resolve_challenge(username, password, session=None):
+    cl = new_client(session[0] if session else None)
+
+    cl.login(username, password=password)
+    return cl
+
+
+async def refresh_session(username, tg_user_id, cl=None, priority=PRIORITY_LOW):
+    """Validate a stored session against Instagram and store its refreshed cookies.
+
+    ``cl`` is the user's resident Client, if any; otherwise one is rebuilt
+    from the store. Returns the validated Client, or None if the session
+    is gone.
+    """
+    if cl is None:
+        session = await asyncio.to_thread(session_store.load, username, tg_user_id)
+        if session is None:
+            return None
+        cl = await ig_executor.run(tg_user_id, new_client, session[0], priority=priority)
+        cl.username = cl.username or username
+    await governor.run(
+        tg_user_id, account_key(username), "login/verify", functools.partial(cl.user_info_v1, cl.user_id), priority
+    )
+    settings = await ig_executor.run(tg_user_id, cl.get_settings, priority=priority)
+    # Parking semantics: a kept session stays kept, an ephemeral one stays ephemeral.
+    await asyncio.to_thread(
+        session_store.save, username, tg_user_id, settings, verified_at=time.time(), ephemeral=True
+    )
+    return cl
+
+
+async def get_client(user_id):
+    """Return the user's Client, restoring it from the session store after a restart."""
+    cl = cl_dict.get(user_id)
+    if cl is not None:
+        return cl
+    stored = cl_dict.parking.get(user_id) or await asyncio.to_thread(session_store.load_for_user, user_id)
+    if stored is None:
+        return None
+    username, settings, verified_at = stored
+    try:
+        cl = await login_instagram(user_id, username, session=(settings, verified_at))
+    except Exception as e:
+        log.warning("Could not restore the session of %s: %s", username, e)
+        return None
+    if cl is not None and cl.user_id:
+        cl_dict[user_id] = cl
+        return cl
+    return None
+
+
+class SessionMaintainer:
+    """Background worker re-validating stored sessions before they go stale.
+
+    A session verified within ``SESSION_VERIFY_TTL`` is restored without a
+    round trip to Instagram, so refreshing sessions ahead of that deadline
+    keeps the login cost out of the Telegram handlers. Every
+    ``SESSION_REFRESH_INTERVAL`` the oldest sessions are validated in
+    parallel, at most ``SESSION_REFRESH_CONCURRENCY`` at a time and with
+    staggered starts. Accounts with an upcoming live (see ``expect``) go
+    first, at normal priority, and their Client is kept resident.
+    """
+
+    def __init__(self):
+        self._upcoming = {}
+        self._failed = {}
+        self._task = None
+        self._wakeup = None
+
+    def expect(self, tg_user_id, at):
+        """Make sure the user's session is fresh and resident by ``at``."""
+        self._upcoming[tg_user_id] = at
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def forget(self, tg_user_id):
+        self._upcoming.pop(tg_user_id, None)
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh_due()
+            except Exception as e:
+                log.error("Session maintenance failed: %s", e)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), SESSION_REFRESH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _due(self):
+        now = time.time()
+        due = {}
+        for tg_user_id, at in sorted(self._upcoming.items(), key=lambda item: item[1]):
+            if at < now - SESSION_REFRESH_INTERVAL:
+                del self._upcoming[tg_user_id]
+                continue
+            if at > now + 2 * SESSION_REFRESH_INTERVAL:
+                # Too early: the client would sit in memory for nothing.
+                continue
+            stored = await asyncio.to_thread(session_store.load_for_user, tg_user_id)
+            if stored is None:
+                continue
+            username, _, verified_at = stored
+            # Fresh enough to last until the live starts, and already resident.
+            if verified_at + SESSION_VERIFY_TTL > at + SESSION_REFRESH_INTERVAL and tg_user_id in cl_dict:
+                continue
+            due[username] = (tg_user_id, True)
+        # Refresh a session before its verification would expire, with a
+        # scan interval of slack.
+        stale = await asyncio.to_thread(
+            session_store.stale, now - SESSION_VERIFY_TTL + 2 * SESSION_REFRESH_INTERVAL, SESSION_REFRESH_BATCH
+        )
+        for username, tg_user_id in stale:
+            if username not in due:
+                due[username] = (tg_user_id, False)
+        return [
+            (username, tg_user_id, upcoming)
+            for username, (tg_user_id, upcoming) in due.items()
+            if worker_owns(tg_user_id) and now - self._failed.get(username, 0) > SESSION_REFRESH_RETRY
+        ]
+
+    async def refresh_due(self):
+        due = await self._due()
+        if not due:
+            return
+        semaphore = asyncio.Semaphore(SESSION_REFRESH_CONCURRENCY)
+
+        async def refresh(delay, username, tg_user_id, upcoming):
+            await asyncio.sleep(delay)
+            async with semaphore:
+                await self._refresh(username, tg_user_id, upcoming)
+
+        await asyncio.gather(*(
+            refresh((i + random.random()) * SESSION_REFRESH_STAGGER, *item)
+            for i, item in enumerate(due)
+        ))
+
+    async def _refresh(self, username, tg_user_id, upcoming):
+        resident = cl_dict.get(tg_user_id)
+        if resident is not None and getattr(resident, "username", None) != username:
+            resident = None
+        try:
+            # Only the refresh of an upcoming live may wait for the account budget.
+            cl = await refresh_session(
+                username, tg_user_id, resident, PRIORITY_NORMAL if upcoming else PRIORITY_LOW
+            )
+        except (BudgetExceeded, CircuitOpenError) as e:
+            log.debug("Refresh of %s postponed: %s", username, e)
+            return
+        except Exception as e:
+            self._failed[username] = time.time()
+            metrics.inc("session_refreshes_total", (("result", "failed"),))
+            log.warning("Could not refresh the session of %s: %s", username, e)
+            return
+        metrics.inc("session_refreshes_total", (("result", "ok"),))
+        if cl is None:
+            return
+        if upcoming and tg_user_id not in cl_dict:
+            cl_dict[tg_user_id] = cl
+        elif tg_user_id not in cl_dict:
+            ig_executor.forget(tg_user_id)
+
+
+session_maintainer = SessionMaintainer()
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [["Login", "Start Live"]]
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
@@ -209,12 +2797,12 @@ async def login_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def ask_username(update: Update, context: ContextTypes.DEFAULT_TYPE):
     username = update.message.text.strip()
     context.user_data["username"] = username
-    session_file = f"{username}_session.json"
+    session = await asyncio.to_thread(session_store.load, username, update.effective_user.id)
 
-    if os.path.exists(session_file):
+    if session:
         await update.message.reply_text("Session found! Verifying...")
         try:
-            cl = login_instagram(username, session_file=session_file)
+            cl = await login_instagram(update.effective_user.id, username, session=session)
             if cl and cl.user_id:
                 cl_dict[update.effective_user.id] = cl
                 await update.message.reply_text(
@@ -233,12 +2821,11 @@ async def ask_password(update: Update, context: ContextTypes.DEFAULT_TYPE):
     password = update.message.text.strip()
     context.user_data["password"] = password
     username = context.user_data.get("username")
-    session_file = f"{username}_session.json"
 
     await update.message.reply_text("Attempting login...")
 
     try:
-        cl = login_instagram(username, password=password, session_file=session_file)
+        cl = await login_instagram(update.effective_user.id, username, password=password)
         if cl and cl.user_id:
             cl_dict[update.effective_user.id] = cl
             inline_keyboard = InlineKeyboardMarkup([
@@ -256,11 +2843,11 @@ async def ask_password(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("Error during login, please try again.")
             return ConversationHandler.END
 
-    except TwoFactorRequired:
+    except ig_errors.TwoFactorRequired:
         await update.message.reply_text("Instagram requires a 2FA code. Please enter it now:")
         return ASK_2FA
 
-    except ChallengeRequired:
+    except ig_errors.ChallengeRequired:
         await update.message.reply_text(
             "Instagram triggered a checkpoint challenge (approval required). "
             "You can open the IG app/website to approve it, or try an automatic approach."
@@ -285,7 +2872,7 @@ async def ask_challenge(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     username = context.user_data.get("username")
     password = context.user_data.get("password")
-    session_file = f"{username}_session.json"
+    session = await asyncio.to_thread(session_store.load, username, update.effective_user.id)
 
     if data == "manual_challenge":
         await query.message.reply_text(
@@ -297,11 +2884,9 @@ async def ask_challenge(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif data == "auto_challenge":
         await query.message.reply_text("Attempting to resolve the challenge automatically... please wait.")
         try:
-            cl = Client()
-            if os.path.exists(session_file):
-                cl.load_settings(session_file)
-
-            cl.login(username, password=password)
+            cl = await ig_executor.run(
+                update.effective_user.id, resolve_challenge, username, password, session
+            )
             if cl.user_id:
                 cl_dict[update.effective_user.id] = cl
                 inline_keyboard = InlineKeyboardMarkup([
@@ -333,16 +2918,15 @@ async def ask_2fa(update: Update, context: ContextTypes.DEFAULT_TYPE):
     verification_code = update.message.text.strip()
     username = context.user_data.get("username")
     password = context.user_data.get("password")
-    session_file = f"{username}_session.json"
 
     await update.message.reply_text("2FA verification in progress...")
 
     try:
-        cl = login_instagram(
-            username=username,
+        cl = await login_instagram(
+            update.effective_user.id,
+            username,
             password=password,
             verification_code=verification_code,
-            session_file=session_file
         )
         if cl and cl.user_id:
             cl_dict[update.effective_user.id] = cl
@@ -370,22 +2954,23 @@ async def ask_save_session_callback(update: Update, context: ContextTypes.DEFAUL
     query = update.callback_query
     data = query.data
     username = context.user_data.get("username")
-    session_file = f"{username}_session.json"
     await query.answer()
 
     cl = cl_dict.get(update.effective_user.id)
     if data == "save_session":
         if cl:
             try:
-                cl.dump_settings(session_file)
+                settings = await ig_executor.run(update.effective_user.id, cl.get_settings)
+                await asyncio.to_thread(
+                    session_store.save, username, update.effective_user.id, settings, verified_at=time.time()
+                )
                 await query.message.reply_text("Session saved successfully!")
             except Exception as e:
                 await query.message.reply_text(f"Error while saving the session: {e}")
         else:
             await query.message.reply_text("Cannot save session (Client not found).")
     elif data == "discard_session":
-        if os.path.exists(session_file):
-            os.remove(session_file)
+        await asyncio.to_thread(session_store.delete, username)
         await query.message.reply_text("Session not saved.")
 
     reply_markup = ReplyKeyboardMarkup([["Start Live"]], resize_keyboard=True)
@@ -396,36 +2981,123 @@ async def ask_save_session_callback(update: Update, context: ContextTypes.DEFAUL
     return ConversationHandler.END
 
 
+class PrewarmedBroadcast:
+    """A broadcast created in the background while the operator types the title.
+
+    Instagram sets the title when the broadcast is created and offers no way
+    to change it afterwards, so the broadcast is created with the user's last
+    title and only used if the same title is submitted. Otherwise, or after
+    ``PREWARM_TIMEOUT`` seconds, it is ended and thrown away.
+    """
+
+    def __init__(self, user_id, ig_live, title):
+        self.user_id = user_id
+        self.ig_live = ig_live
+        self.title = title
+        self.task = asyncio.create_task(ig_live.create_broadcast(title))
+        self._expiry = asyncio.get_running_loop().call_later(PREWARM_TIMEOUT, self.discard)
+
+    async def claim(self):
+        self._expiry.cancel()
+        if prewarmed.get(self.user_id) is self:
+            del prewarmed[self.user_id]
+        return await self.task
+
+    def discard(self):
+        self._expiry.cancel()
+        if prewarmed.get(self.user_id) is self:
+            del prewarmed[self.user_id]
+        spawn(self._end())
+
+    async def _end(self):
+        try:
+            created = await self.task
+            if created:
+                await self.ig_live.end_broadcast()
+        except Exception as e:
+            ig_log.error("Error discarding pre-created live: %s", e)
+
+
+prewarmed = {}
+last_titles = {}
+
+
 async def ask_live_title(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    if user_id not in cl_dict:
+    cl = await get_client(user_id)
+    if cl is None:
         await update.message.reply_text("You must first log in with /login")
         return ConversationHandler.END
-    await update.message.reply_text(
-        "Please enter the live title:",
-        reply_markup=ReplyKeyboardRemove()
-    )
+
+    title = last_titles.get(user_id, PREWARM_TITLE)
+    if PREWARM_BROADCASTS and broadcasts.get(user_id) is None:
+        stale = prewarmed.get(user_id)
+        if stale is not None and stale.title != title:
+            stale.discard()
+        if user_id not in prewarmed:
+            prewarmed[user_id] = PrewarmedBroadcast(user_id, make_instagram_live(cl, user_id), title)
+        reply_markup = ReplyKeyboardMarkup([[title]], resize_keyboard=True, one_time_keyboard=True)
+        prompt = f"Please enter the live title (choose \"{title}\" to go live faster):"
+    else:
+        reply_markup = ReplyKeyboardRemove()
+        prompt = "Please enter the live title:"
+    await update.message.reply_text(prompt, reply_markup=reply_markup)
     return ASK_TITLE
 
 
+def activate_broadcast(live):
+    """Mark a started broadcast live and attach its poller, dashboard and relay."""
+    broadcasts.mark_started(live)
+    live.monitor = LiveMonitor(live.user_id, live.chat_id, live.ig_live)
+    if DASHBOARD:
+        live.dashboard = Dashboard(live)
+        live.monitor.attach(live.dashboard)
+        spawn(live.dashboard.open())
+    live.monitor.start()
+    if RELAY_ENABLED:
+        try:
+            live.relay = RelaySupervisor(f"{live.ig_live.stream_server}{live.ig_live.stream_key}")
+            live.relay.start()
+        except RuntimeError as e:
+            log.error("Could not start the relay of %s: %s", live.broadcast_id, e)
+
+
 async def handle_live_title(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    global current_broadcast
-    if current_broadcast is not None:
+    user_id = update.effective_user.id
+    if broadcasts.get(user_id) is not None:
         await update.message.reply_text("A live is already running.")
         return ConversationHandler.END
 
-    user_id = update.effective_user.id
-    if user_id not in cl_dict:
+    cl = await get_client(user_id)
+    if cl is None:
         await update.message.reply_text("You must first log in with /login")
         return ConversationHandler.END
 
-    cl = cl_dict[user_id]
-    ig_live = InstagramLive(cl)
     title = update.message.text
+    last_titles[user_id] = title
+    pre = prewarmed.get(user_id)
+    if pre is not None and pre.title != title:
+        pre.discard()
+        pre = None
+    ig_live = pre.ig_live if pre is not None else make_instagram_live(cl, user_id)
+    account = getattr(cl, "username", None) or str(cl.user_id)
+    live = Broadcast(user_id, account, update.effective_chat.id, ig_live, title)
+    try:
+        broadcasts.add(live)
+    except ValueError:
+        # A scheduled live was prepared meanwhile.
+        if pre is not None:
+            pre.discard()
+        await update.message.reply_text("A live is already running.")
+        return ConversationHandler.END
     await update.message.reply_text("Creating live, please wait...")
-    broadcast = ig_live.create_broadcast(title)
+    if pre is not None:
+        broadcast = await pre.claim()
+    else:
+        broadcast = await ig_live.create_broadcast(title)
 
     if not broadcast:
+        broadcasts.mark_ended(live)
         keyboard = [["Start Live"]]
         reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
         await update.message.reply_text(
@@ -434,8 +3106,9 @@ async def handle_live_title(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return ConversationHandler.END
 
-    started = ig_live.start_broadcast()
+    started = await ig_live.start_broadcast()
     if not started:
+        broadcasts.mark_ended(live)
         keyboard = [["Start Live"]]
         reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
         await update.message.reply_text(
@@ -444,18 +3117,17 @@ async def handle_live_title(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return ConversationHandler.END
 
-    stream_url = broadcast["stream_server"]
-    stream_key = broadcast["stream_key"]
-    current_broadcast = ig_live.broadcast_id
-    context.user_data["instagram_live"] = ig_live
-    context.user_data["stream_url"] = stream_url
-    context.user_data["stream_key"] = stream_key
+    activate_broadcast(live)
 
     inline_keyboard = InlineKeyboardMarkup([
         [InlineKeyboardButton("Show Streaming URL", callback_data="url")],
         [InlineKeyboardButton("Show Streaming Key", callback_data="key")]
     ])
     await update.message.reply_text("Live successfully started! Use the buttons below:", reply_markup=inline_keyboard)
+    if live.relay:
+        await update.message.reply_text(
+            f"Managed ingest is on, stream to the bot's relay instead:\n{live.relay.ingest_url}"
+        )
 
     keyboard = [["Stop Live", "Live Info"], ["Get Comments", "Get Viewer List"]]
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
@@ -463,24 +3135,333 @@ async def handle_live_title(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
+SCHEDULE_PENDING = "pending"
+SCHEDULE_PREPARED = "prepared"
+SCHEDULE_STARTED = "started"
+SCHEDULE_FAILED = "failed"
+SCHEDULE_CANCELLED = "cancelled"
+
+
+class ScheduleStore:
+    """Scheduled lives persisted next to the sessions, in the same SQLite file.
+
+    A job moves from pending to prepared once its broadcast is created (the
+    broadcast id and stream credentials are stored so a restarted bot can
+    still start it), then to started, failed or cancelled.
+    """
+
+    def __init__(self, path=SESSION_DB):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS scheduled_lives ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "tg_user_id INTEGER NOT NULL, "
+                "chat_id INTEGER NOT NULL, "
+                "title TEXT NOT NULL, "
+                "go_live_at REAL NOT NULL, "
+                "state TEXT NOT NULL, "
+                "broadcast_id TEXT, "
+                "stream_server TEXT, "
+                "stream_key TEXT, "
+                "error TEXT, "
+                "created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS scheduled_lives_state ON scheduled_lives (state, go_live_at)")
+        return self._conn
+
+    def add(self, tg_user_id, chat_id, title, go_live_at):
+        """Store a pending job and return it as a dict."""
+        with self._lock:
+            cursor = self._db().execute(
+                "INSERT INTO scheduled_lives (tg_user_id, chat_id, title, go_live_at, state, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (tg_user_id, chat_id, title, go_live_at, SCHEDULE_PENDING, time.time()),
+            )
+            row = self._db().execute("SELECT * FROM scheduled_lives WHERE id = ?", (cursor.lastrowid,)).fetchone()
+        return dict(row)
+
+    def active(self, tg_user_id=None):
+        """Return the pending and prepared jobs, of one user or of everyone, soonest first."""
+        query = "SELECT * FROM scheduled_lives WHERE state IN (?, ?)"
+        params = [SCHEDULE_PENDING, SCHEDULE_PREPARED]
+        if tg_user_id is not None:
+            query += " AND tg_user_id = ?"
+            params.append(tg_user_id)
+        with self._lock:
+            rows = self._db().execute(query + " ORDER BY go_live_at", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def update(self, job_id, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db().execute(
+                f"UPDATE scheduled_lives SET {assignments} WHERE id = ?", (*fields.values(), job_id)
+            )
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+schedule_store = ScheduleStore()
+
+
+def format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
+
+
+def parse_schedule_time(args, now=None):
+    """Parse the go-live time at the start of ``args``.
+
+    Accepts ``+90m``/``+2h``/``+1h30m`` (relative), ``HH:MM`` (next
+    occurrence, local time) and ``YYYY-MM-DD HH:MM``. Returns the timestamp
+    and the remaining arguments; raises ValueError when nothing matches.
+    """
+    now = now or time.time()
+    if not args:
+        raise ValueError("missing time")
+    first = args[0]
+    relative = re.fullmatch(r"\+(?:(\d+)h)?(?:(\d+)m)?", first)
+    if relative and any(relative.groups()):
+        hours, minutes = (int(g or 0) for g in relative.groups())
+        return now + hours * 3600 + minutes * 60, args[1:]
+    if re.fullmatch(r"\d{1,2}:\d{2}", first):
+        hour, minute = map(int, first.split(":"))
+        if hour > 23 or minute > 59:
+            raise ValueError(f"invalid time {first!r}")
+        day = time.localtime(now)
+        timestamp = time.mktime((day.tm_year, day.tm_mon, day.tm_mday, hour, minute, 0, 0, 0, -1))
+        if timestamp <= now:
+            timestamp = time.mktime((day.tm_year, day.tm_mon, day.tm_mday + 1, hour, minute, 0, 0, 0, -1))
+        return timestamp, args[1:]
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", first) and len(args) > 1 and re.fullmatch(r"\d{1,2}:\d{2}", args[1]):
+        return time.mktime(time.strptime(f"{first} {args[1]}", "%Y-%m-%d %H:%M")), args[2:]
+    raise ValueError(f"unrecognized time {first!r}")
+
+
+class LiveScheduler:
+    """Starts scheduled lives, preparing each one ``SCHEDULE_LEAD`` seconds ahead.
+
+    Preparing means restoring the account's Client and creating the
+    broadcast, so the operator gets the stream key in time to set up the
+    encoder and going live is a single request. Preparations are spread
+    over a random ``SCHEDULE_JITTER`` window and at most
+    ``SCHEDULE_CONCURRENCY`` run at once, so many lives scheduled for the
+    same minute don't hit Instagram all at once. Jobs are kept in the
+    schedule store and picked up again after a restart.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._lives = {}
+        self._running = set()
+        self._semaphore = None
+        self._wakeup = None
+        self._task = None
+
+    async def start(self):
+        self._semaphore = asyncio.Semaphore(SCHEDULE_CONCURRENCY)
+        self._wakeup = asyncio.Event()
+        for job in await asyncio.to_thread(schedule_store.active):
+            if worker_owns(job["tg_user_id"]):
+                self._track(job)
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _track(self, job):
+        job["prepare_at"] = job["go_live_at"] - SCHEDULE_LEAD - random.uniform(0, SCHEDULE_JITTER)
+        self._jobs[job["id"]] = job
+        self._expect_next(job["tg_user_id"])
+
+    def _expect_next(self, tg_user_id):
+        """Have the user's session refreshed in time for their next preparation."""
+        pending = [job["prepare_at"] for job in self.jobs_of(tg_user_id) if job["id"] not in self._lives]
+        if pending:
+            session_maintainer.expect(tg_user_id, min(pending))
+        else:
+            session_maintainer.forget(tg_user_id)
+
+    def add(self, job):
+        self._track(job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def jobs_of(self, tg_user_id):
+        return sorted(
+            (job for job in self._jobs.values() if job["tg_user_id"] == tg_user_id),
+            key=lambda job: job["go_live_at"],
+        )
+
+    async def cancel(self, tg_user_id, job_id):
+        job = self._jobs.get(job_id)
+        if job is None or job["tg_user_id"] != tg_user_id or job_id in self._running:
+            return False
+        del self._jobs[job_id]
+        live = self._lives.pop(job_id, None)
+        if live is not None:
+            broadcasts.mark_ended(live)
+            try:
+                await live.ig_live.end_broadcast()
+            except Exception as e:
+                ig_log.error("Error ending cancelled live %s: %s", live.broadcast_id, e)
+        await asyncio.to_thread(schedule_store.update, job_id, state=SCHEDULE_CANCELLED)
+        self._expect_next(tg_user_id)
+        return True
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            next_at = now + SCHEDULE_MAX_SLEEP
+            for job in list(self._jobs.values()):
+                if job["id"] in self._running:
+                    continue
+                if job["state"] == SCHEDULE_PENDING or job["id"] not in self._lives:
+                    step, at = self._prepare, job["prepare_at"]
+                else:
+                    step, at = self._go_live, job["go_live_at"]
+                if at <= now:
+                    self._launch(step, job)
+                else:
+                    next_at = min(next_at, at)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), next_at - now)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _launch(self, step, job):
+        self._running.add(job["id"])
+
+        async def run():
+            try:
+                await step(job)
+            except Exception as e:
+                log.error("Scheduled live %s failed: %s", job["id"], e)
+                await self._fail(job, "unexpected error")
+            finally:
+                self._running.discard(job["id"])
+                self._wakeup.set()
+
+        spawn(run())
+
+    async def _fail(self, job, reason):
+        self._jobs.pop(job["id"], None)
+        live = self._lives.pop(job["id"], None)
+        if live is not None and live.state != BROADCAST_ENDED:
+            broadcasts.mark_ended(live)
+            # A broadcast prepared ahead of time stays open on Instagram
+            # (and blocks the next one) until it is ended explicitly.
+            if live.ig_live.broadcast_id:
+                try:
+                    await live.ig_live.end_broadcast()
+                except Exception as e:
+                    ig_log.error("Error ending failed scheduled live %s: %s", live.ig_live.broadcast_id, e)
+        self._expect_next(job["tg_user_id"])
+        metrics.inc("scheduled_lives_total", (("result", "failed"),))
+        await asyncio.to_thread(schedule_store.update, job["id"], state=SCHEDULE_FAILED, error=reason)
+        sender.send(job["chat_id"], f"⚠️ Scheduled live \"{job['title']}\" failed: {reason}")
+
+    async def _prepare(self, job):
+        """Create the broadcast, or rebuild a broadcast created before a restart."""
+        user_id = job["tg_user_id"]
+        if time.time() - job["go_live_at"] > SCHEDULE_GRACE:
+            await self._fail(job, "the bot was not running at go-live time")
+            return
+        async with self._semaphore:
+            if broadcasts.get(user_id) is not None:
+                await self._fail(job, "another live was running")
+                return
+            cl = await get_client(user_id)
+            if cl is None:
+                await self._fail(job, "no valid Instagram session, log in with /login and save the session")
+                return
+            ig_live = make_instagram_live(cl, user_id)
+            account = getattr(cl, "username", None) or str(cl.user_id)
+            live = Broadcast(user_id, account, job["chat_id"], ig_live, job["title"])
+            broadcasts.add(live)
+            self._lives[job["id"]] = live
+            if job["broadcast_id"]:
+                ig_live.broadcast_id = int(job["broadcast_id"])
+                ig_live.stream_server = job["stream_server"]
+                ig_live.stream_key = job["stream_key"]
+                return
+            created = await ig_live.create_broadcast(job["title"])
+        if not created:
+            await self._fail(job, f"could not create the broadcast ({ig_live.last_error or 'unknown error'})")
+            return
+        job.update(
+            state=SCHEDULE_PREPARED,
+            broadcast_id=str(ig_live.broadcast_id),
+            stream_server=ig_live.stream_server,
+            stream_key=ig_live.stream_key,
+        )
+        await asyncio.to_thread(
+            schedule_store.update, job["id"], state=SCHEDULE_PREPARED, broadcast_id=job["broadcast_id"],
+            stream_server=job["stream_server"], stream_key=job["stream_key"],
+        )
+        sender.send(
+            job["chat_id"],
+            f"🗓 Scheduled live \"{job['title']}\" goes live at {format_time(job['go_live_at'])}.\n"
+            f"Start your encoder now:\n- Server URL: {ig_live.stream_server}\n- Stream Key: {ig_live.stream_key}",
+        )
+
+    async def _go_live(self, job):
+        live = self._lives[job["id"]]
+        started = await live.ig_live.start_broadcast()
+        if not started:
+            await self._fail(job, f"could not start the broadcast ({live.ig_live.last_error or 'unknown error'})")
+            return
+        del self._jobs[job["id"]]
+        del self._lives[job["id"]]
+        activate_broadcast(live)
+        self._expect_next(job["tg_user_id"])
+        metrics.inc("scheduled_lives_total", (("result", "started"),))
+        await asyncio.to_thread(schedule_store.update, job["id"], state=SCHEDULE_STARTED)
+        message = f"🔴 Scheduled live \"{job['title']}\" is now live!"
+        if live.relay:
+            message += f"\nManaged ingest is on, stream to the bot's relay instead:\n{live.relay.ingest_url}"
+        sender.send(job["chat_id"], message)
+
+
+live_scheduler = LiveScheduler()
+
+
 async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
+    live = broadcasts.get(update.effective_user.id)
     if query.data == "url":
-        stream_url = context.user_data.get("stream_url", "URL not available.")
-        await query.message.reply_text(f"{stream_url}")
+        stream_url = live.ig_live.stream_server if live else None
+        await query.message.reply_text(f"{stream_url or 'URL not available.'}")
     elif query.data == "key":
-        stream_key = context.user_data.get("stream_key", "Key not available.")
-        await query.message.reply_text(f"{stream_key}")
+        stream_key = live.ig_live.stream_key if live else None
+        await query.message.reply_text(f"{stream_key or 'Key not available.'}")
 
 
 async def handle_live_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    global current_broadcast
-    if current_broadcast is None:
+    live = broadcasts.get(update.effective_user.id)
+    if live is None or live.state != BROADCAST_STARTED:
         await update.message.reply_text("No live is currently running.")
         return
-    ig_live = context.user_data.get("instagram_live")
-    info = ig_live.live_info()
+    if live.dashboard:
+        await live.monitor.jobs["info"].get()
+        live.dashboard.touch()
+        return
+    info = await live.monitor.jobs["info"].get()
     if info:
         msg = (
             f"📡 **Live Info:**\n"
@@ -490,21 +3471,22 @@ async def handle_live_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"- Viewer Count: {info['viewer_count']}\n"
             f"- Status: {info['status']}"
         )
+        if live.relay:
+            msg += f"\n- Relay Ingest: {live.relay.ingest_url}\n{live.relay.describe()}"
         await update.message.reply_text(msg)
     else:
         await update.message.reply_text("Error retrieving live information.")
 
 
 async def handle_stop_live(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    global current_broadcast
-    if current_broadcast is None:
+    live = broadcasts.get(update.effective_user.id)
+    if live is None or live.state != BROADCAST_STARTED:
         await update.message.reply_text("No live is currently running.")
         return
-    ig_live = context.user_data.get("instagram_live")
     await update.message.reply_text("Ending live...")
-    success = ig_live.end_broadcast()
+    success = await live.ig_live.end_broadcast()
     if success:
-        current_broadcast = None
+        broadcasts.mark_ended(live)
         context.user_data.clear()
         keyboard = [["Login", "Start Live"]]
         reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
@@ -514,37 +3496,239 @@ async def handle_stop_live(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def handle_get_comments(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    global current_broadcast
-    if current_broadcast is None:
+    live = broadcasts.get(update.effective_user.id)
+    if live is None or live.state != BROADCAST_STARTED:
         await update.message.reply_text("No live is currently running.")
         return
-    ig_live = context.user_data.get("instagram_live")
-    comments = ig_live.get_comments()
-    if comments:
-        comment_messages = "\n".join(
-            [f"💬 {comment['username']} > {comment['text']}" for comment in comments]
-        )
-        await update.message.reply_text(f"**Comments:**\n{comment_messages}")
-    else:
-        await update.message.reply_text("No comments.")
+    # New comments are pushed to the chat (or the dashboard) by the poll job itself.
+    comments = await live.monitor.jobs["comments"].refresh()
+    if live.dashboard:
+        live.dashboard.touch()
+    elif not comments:
+        await update.message.reply_text("No new comments.")
 
 
 async def handle_get_viewer_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    global current_broadcast
-    if current_broadcast is None:
+    live = broadcasts.get(update.effective_user.id)
+    if live is None or live.state != BROADCAST_STARTED:
         await update.message.reply_text("No live is currently running.")
         return
-    ig_live = context.user_data.get("instagram_live")
-    viewers, ids = ig_live.get_viewer_list()
-    if viewers:
-        viewer_list = "\n".join([f"👤 {v}" for v in viewers])
-        await update.message.reply_text(f"**Viewer List:**\n{viewer_list}")
-    else:
+    await live.monitor.jobs["viewers"].get()
+    if live.dashboard:
+        live.dashboard.touch()
+        return
+    tracker = live.monitor.viewers
+    joined, left = tracker.take_delta()
+    if not tracker.present and not left:
         await update.message.reply_text("No one is watching the live.")
+    elif not joined and not left:
+        await update.message.reply_text(f"No changes, {len(tracker.present)} watching.")
+    else:
+        lines = [f"👤 {v}" for v in joined] + [f"👋 {v} left" for v in left]
+        viewer_list = "\n".join(lines)
+        sender.send(update.effective_chat.id, f"**Viewers ({len(tracker.present)} watching):**\n{viewer_list}")
 
 
-def main():
-    app = ApplicationBuilder().token(TOKEN).build()
+async def handle_unmute(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    live = broadcasts.get(update.effective_user.id)
+    if live is None or live.state != BROADCAST_STARTED:
+        await update.message.reply_text("No live is currently running.")
+        return
+    muted = live.monitor.comments.muted
+    if not context.args:
+        await update.message.reply_text(f"Muted: {', '.join(sorted(muted))}" if muted else "Nobody is muted.")
+        return
+    username = context.args[0].lstrip("@")
+    if username in muted:
+        muted.discard(username)
+        await update.message.reply_text(f"🔊 {username} unmuted.")
+    else:
+        await update.message.reply_text(f"{username} is not muted.")
+
+
+async def handle_export(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    if context.args:
+        broadcast_id = context.args[0]
+        if not broadcast_id.isdigit():
+            await update.message.reply_text("Usage: /export [broadcast_id]")
+            return
+    else:
+        live = broadcasts.get(user_id)
+        broadcast_id = live.broadcast_id if live and live.broadcast_id else archive.latest(user_id)
+    if broadcast_id is None or not os.path.exists(archive.path(user_id, broadcast_id)):
+        await update.message.reply_text("No archived comments found.")
+        return
+
+    await asyncio.to_thread(archive.sync)
+    parts = await asyncio.to_thread(archive.parts, user_id, broadcast_id)
+    for number, (start, end) in enumerate(parts, 1):
+        # Only one part is held in memory at a time.
+        data = await asyncio.to_thread(archive.read, user_id, broadcast_id, start, end)
+        suffix = f".part{number}" if len(parts) > 1 else ""
+        await update.message.reply_document(
+            InputFile(data, filename=f"comments_{broadcast_id}{suffix}.jsonl"),
+            caption=f"Comments of live {broadcast_id}" + (f" ({number}/{len(parts)})" if len(parts) > 1 else ""),
+        )
+
+
+async def handle_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    if not context.args:
+        jobs = live_scheduler.jobs_of(user_id)
+        if not jobs:
+            await update.message.reply_text(
+                "No lives scheduled. Usage: /schedule <HH:MM | YYYY-MM-DD HH:MM | +1h30m> <title>"
+            )
+            return
+        lines = [f"#{job['id']} {format_time(job['go_live_at'])} {job['title']} ({job['state']})" for job in jobs]
+        await update.message.reply_text("🗓 Scheduled lives:\n" + "\n".join(lines) + "\nCancel one with /unschedule <id>")
+        return
+    try:
+        go_live_at, rest = parse_schedule_time(context.args)
+    except ValueError:
+        await update.message.reply_text("Usage: /schedule <HH:MM | YYYY-MM-DD HH:MM | +1h30m> <title>")
+        return
+    title = " ".join(rest)
+    if not title:
+        await update.message.reply_text("Please add a title after the time.")
+        return
+    if go_live_at <= time.time():
+        await update.message.reply_text("That time has already passed.")
+        return
+    if len(live_scheduler.jobs_of(user_id)) >= SCHEDULE_USER_LIMIT:
+        await update.message.reply_text(f"You can have at most {SCHEDULE_USER_LIMIT} lives scheduled.")
+        return
+    if await get_client(user_id) is None:
+        await update.message.reply_text("You must first log in with /login")
+        return
+    job = await asyncio.to_thread(schedule_store.add, user_id, update.effective_chat.id, title, go_live_at)
+    live_scheduler.add(job)
+    await update.message.reply_text(
+        f"Scheduled \"{title}\" (#{job['id']}) for {format_time(go_live_at)}. "
+        f"You will get the stream key about {round(SCHEDULE_LEAD / 60)} minutes before."
+    )
+
+
+async def handle_unschedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not context.args or not context.args[0].lstrip("#").isdigit():
+        await update.message.reply_text("Usage: /unschedule <id>")
+        return
+    job_id = int(context.args[0].lstrip("#"))
+    if await live_scheduler.cancel(update.effective_user.id, job_id):
+        await update.message.reply_text(f"Scheduled live #{job_id} cancelled.")
+    else:
+        await update.message.reply_text(f"No cancellable scheduled live #{job_id}.")
+
+
+async def handle_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    sender.send(update.effective_chat.id, f"📊 Stats:\n{metrics.summary()}")
+
+
+metrics.gauge("active_broadcasts", lambda: len(broadcasts))
+metrics.gauge("resident_clients", lambda: len(cl_dict))
+metrics.gauge("outbound_messages_pending", lambda: sender.pending())
+
+metrics_server = None
+metrics_port_offset = 0
+worker_index = WORKER_INDEX
+worker_count = WORKER_COUNT
+loop_lag_task = None
+
+
+def worker_owns(tg_user_id):
+    """Whether this process handles the user's updates (always, unless it is one of several workers)."""
+    return worker_count <= 1 or tg_user_id % worker_count == worker_index
+
+
+async def on_startup(app):
+    global metrics_server, loop_lag_task
+    sender.bot = app.bot
+    loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+    if SESSION_REFRESH_INTERVAL:
+        session_maintainer.start()
+    if MODERATION_RULES:
+        moderator.start()
+    await live_scheduler.start()
+    if METRICS_PORT:
+        metrics_server = MetricsServer(port=METRICS_PORT + metrics_port_offset)
+        await metrics_server.start()
+
+
+async def on_shutdown(app):
+    if loop_lag_task is not None:
+        loop_lag_task.cancel()
+    if metrics_server is not None:
+        await metrics_server.stop()
+    session_maintainer.stop()
+    live_scheduler.stop()
+    moderator.stop()
+    sender.close()
+    poll_scheduler.stop()
+    await asyncio.to_thread(archive.stop)
+    await close_http_session()
+    schedule_store.close()
+    session_store.close()
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates of different users concurrently and those of one user in order.
+
+    ConversationHandler keeps per-user state and is not safe with fully
+    concurrent updates: two quick messages of the same user would both be
+    handled in the same conversation state.
+    """
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}
+
+    async def process_update(self, update, coroutine):
+        # The user's lock is taken before one of the max_concurrent_updates
+        # slots, so updates queued behind a user's slow handler hold no slot
+        # and never delay other users.
+        user = getattr(update, "effective_user", None)
+        if user is None:
+            await super().process_update(update, coroutine)
+            return
+        entry = self._locks.get(user.id)
+        if entry is None:
+            entry = self._locks[user.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await super().process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[user.id]
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+def build_application(with_updater=True):
+    # Instagram I/O is offloaded to ig_executor, so updates from different
+    # users can be handled concurrently instead of one at a time; each
+    # user's own updates still run in order for the conversation handlers.
+    builder = (
+        ApplicationBuilder()
+        .token(TOKEN)
+        .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if not with_updater:
+        builder = builder.updater(None)
+    app = builder.build()
 
     login_conv_handler = ConversationHandler(
         entry_points=[MessageHandler(filters.TEXT & filters.Regex("^(Login)$"), login_command)],
@@ -571,6 +3755,11 @@ def main():
     )
 
     app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("stats", handle_stats))
+    app.add_handler(CommandHandler("export", handle_export))
+    app.add_handler(CommandHandler("schedule", handle_schedule))
+    app.add_handler(CommandHandler("unschedule", handle_unschedule))
+    app.add_handler(CommandHandler("unmute", handle_unmute))
     app.add_handler(login_conv_handler)
     app.add_handler(live_conv_handler)
 
@@ -580,9 +3769,235 @@ def main():
     app.add_handler(MessageHandler(filters.TEXT & filters.Regex("^(Get Viewer List)$"), handle_get_viewer_list))
 
     app.add_handler(CallbackQueryHandler(handle_callback_query, pattern="^(url|key)$"))
+    return app
+
+
+async def read_body(receive):
+    body = b""
+    more = True
+    while more:
+        message = await receive()
+        body += message.get("body", b"")
+        more = message.get("more_body", False)
+    return body
+
+
+async def respond(send, status, body=b""):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"text/plain; charset=utf-8")],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def parse_update(body):
+    """Decode a webhook body, returning None unless it looks like a Telegram update."""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(payload, dict) or not isinstance(payload.get("update_id"), int):
+        return None
+    return payload
+
+
+async def serve_lifespan(receive, send, on_shutdown=None):
+    """Answer the ASGI lifespan protocol, running ``on_shutdown`` on teardown."""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if on_shutdown is not None:
+                await on_shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+def update_user_id(payload):
+    """Telegram user id of a raw update, 0 if the update has no sender."""
+    for value in payload.values():
+        if isinstance(value, dict):
+            sender_info = value.get("from") or value.get("user")
+            if isinstance(sender_info, dict) and "id" in sender_info:
+                return sender_info["id"]
+    return 0
+
+
+class WebhookApp:
+    """ASGI app feeding Telegram webhook updates into a running Application."""
+
+    def __init__(self, application, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+        self.application = application
+        self.path = path
+        self.secret = secret
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await serve_lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        if scope["method"] != "POST" or scope["path"] != self.path:
+            await respond(send, 404, b"not found")
+            return
+        if self.secret and dict(scope["headers"]).get(b"x-telegram-bot-api-secret-token") != self.secret.encode():
+            await respond(send, 403, b"forbidden")
+            return
+        # A 5xx answer makes Telegram deliver the update again, so malformed
+        # bodies are refused with 400 instead of failing below.
+        payload = parse_update(await read_body(receive))
+        try:
+            update = Update.de_json(payload, self.application.bot) if payload is not None else None
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            tg_log.warning("Dropping malformed webhook update: %s", e)
+            update = None
+        if update is None:
+            await respond(send, 400, b"bad request")
+            return
+        await self.application.update_queue.put(update)
+        await respond(send, 200, b"ok")
+
+
+class WebhookRouter:
+    """ASGI front end spreading webhook updates over worker processes.
+
+    Updates are routed by Telegram user id, so every update of a user reaches
+    the same worker and its clients, conversations and broadcasts.
+    """
+
+    def __init__(self, worker_urls, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+        self.worker_urls = worker_urls
+        self.path = path
+        self.secret = secret
+        self._session = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await serve_lifespan(receive, send, self.close)
+            return
+        if scope["type"] != "http":
+            return
+        if scope["method"] != "POST" or scope["path"] != self.path:
+            await respond(send, 404, b"not found")
+            return
+        headers = dict(scope["headers"])
+        if self.secret and headers.get(b"x-telegram-bot-api-secret-token") != self.secret.encode():
+            await respond(send, 403, b"forbidden")
+            return
+        body = await read_body(receive)
+        payload = parse_update(body)
+        if payload is None:
+            await respond(send, 400, b"bad request")
+            return
+        user_id = update_user_id(payload)
+        if self._session is None:
+            self._session = httpx.AsyncClient(timeout=httpx.Timeout(30.0))
+        worker_url = self.worker_urls[user_id % len(self.worker_urls)]
+        forward_headers = {"Content-Type": "application/json"}
+        if self.secret:
+            forward_headers["X-Telegram-Bot-Api-Secret-Token"] = self.secret
+        try:
+            response = await self._session.post(worker_url, content=body, headers=forward_headers)
+        except httpx.HTTPError as e:
+            tg_log.error("Could not forward update to %s: %s", worker_url, e)
+            # A non-2xx answer makes Telegram deliver the update again later.
+            await respond(send, 502, b"worker unavailable")
+            return
+        await respond(send, response.status_code, response.content)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.aclose()
+            self._session = None
+
+
+async def serve_asgi(asgi_app, host, port):
+    import uvicorn
+
+    config = uvicorn.Config(asgi_app, host=host, port=port, lifespan="on", log_level="warning")
+    await uvicorn.Server(config).serve()
+
+
+async def register_webhook(bot):
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET or None,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+
+
+async def serve_webhook_worker(host, port, register=False):
+    app = build_application(with_updater=False)
+    async with app:
+        await on_startup(app)
+        if register:
+            await register_webhook(app.bot)
+        await app.start()
+        try:
+            await serve_asgi(WebhookApp(app), host, port)
+        finally:
+            await app.stop()
+    # ``async with`` only shuts the Application down, post_shutdown is run by
+    # run_polling/run_webhook, so call it ourselves.
+    await on_shutdown(app)
+
+
+def webhook_worker_main(index):
+    global metrics_port_offset, worker_index, worker_count
+    setup_logging()
+    worker_index, worker_count = index, WEBHOOK_WORKERS
+    # Every worker process serves its own metrics on the next free port.
+    metrics_port_offset = index + 1
+    try:
+        asyncio.run(serve_webhook_worker("127.0.0.1", WEBHOOK_WORKER_BASE_PORT + index))
+    finally:
+        ig_executor.shutdown()
+        stop_logging()
+
+
+async def serve_webhook_router(worker_urls):
+    app = build_application(with_updater=False)
+    async with app:
+        await register_webhook(app.bot)
+    await serve_asgi(WebhookRouter(worker_urls), WEBHOOK_LISTEN, WEBHOOK_PORT)
+
+
+def run_webhook():
+    if WEBHOOK_WORKERS <= 1:
+        asyncio.run(serve_webhook_worker(WEBHOOK_LISTEN, WEBHOOK_PORT, register=True))
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    ports = [WEBHOOK_WORKER_BASE_PORT + i for i in range(WEBHOOK_WORKERS)]
+    workers = [ctx.Process(target=webhook_worker_main, args=(index,), daemon=True) for index in range(WEBHOOK_WORKERS)]
+    for worker in workers:
+        worker.start()
+    try:
+        asyncio.run(serve_webhook_router([f"http://127.0.0.1:{port}{WEBHOOK_PATH}" for port in ports]))
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+def main():
+    setup_logging()
+    # Parked sessions of users who chose not to save theirs must not outlive the process.
+    session_store.purge_ephemeral()
 
     print("Telegram Bot is running...")
-    app.run_polling()
+    try:
+        if BOT_MODE == "webhook":
+            run_webhook()
+        else:
+            build_application().run_polling()
+    finally:
+        ig_executor.shutdown()
+        stop_logging()
 
 if __name__ == "__main__":
     main()
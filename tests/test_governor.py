@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+import bot
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    monkeypatch.setattr(bot, "IG_BACKOFF_BASE", 0.001)
+    return bot.RequestGovernor()
+
+
+def failing(error):
+    attempts = []
+
+    def send():
+        attempts.append(error)
+        raise error
+
+    return attempts, send
+
+
+def test_normal_priority_throttle_fails_at_once(governor):
+    attempts, send = failing(bot.ig_errors.PleaseWaitFewMinutes("wait a few minutes"))
+    with pytest.raises(bot.ig_errors.PleaseWaitFewMinutes):
+        asyncio.run(governor.run(1, "account", "login", send, bot.PRIORITY_NORMAL))
+    assert len(attempts) == 1
+
+
+def test_high_priority_throttle_is_retried(governor):
+    attempts, send = failing(bot.ig_errors.PleaseWaitFewMinutes("wait a few minutes"))
+    with pytest.raises(bot.ig_errors.PleaseWaitFewMinutes):
+        asyncio.run(governor.run(1, "account", "live/1/end_broadcast/", send, bot.PRIORITY_HIGH))
+    assert len(attempts) == 1 + bot.IG_RETRIES[bot.PRIORITY_HIGH]
+
+
+def test_non_idempotent_request_is_not_resent_after_a_timeout(governor):
+    attempts, send = failing(TimeoutError())
+    with pytest.raises(TimeoutError):
+        asyncio.run(governor.run(1, "account", "live/create/", send, bot.PRIORITY_HIGH, idempotent=False))
+    assert len(attempts) == 1
+
+
+@pytest.mark.parametrize("error", [
+    bot.httpx.ConnectError("refused"), bot.httpx.ReadTimeout("timed out"), bot.httpx.RemoteProtocolError("closed"),
+])
+def test_async_http_transport_errors_are_retried(governor, error):
+    attempts = []
+
+    async def send():
+        attempts.append(error)
+        raise error
+
+    with pytest.raises(type(error)):
+        asyncio.run(governor.run(1, "account", "live/1/end_broadcast/", send, bot.PRIORITY_HIGH))
+    assert len(attempts) == 1 + bot.IG_RETRIES[bot.PRIORITY_HIGH]
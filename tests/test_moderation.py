@@ -0,0 +1,74 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+import bot
+
+
+@pytest.mark.parametrize("pattern", [
+    "(a+)+$",
+    "((a+))+$",
+    "(?:(?:a+))+$",
+    "(a|aa)+$",
+    "(a|a)*$",
+    "(?:x|(a|ab))+$",
+    "(\\w+\\s?)+$",
+    "(a)\\1",
+    "(?P<name>a)",
+])
+def test_backtracking_patterns_are_refused(pattern):
+    with pytest.raises(ValueError):
+        bot.validate_pattern(pattern)
+    with pytest.raises(ValueError):
+        bot.ModerationRules({"hide": {"patterns": ["https?://", pattern]}})
+
+
+@pytest.mark.parametrize("pattern", ["https?://", "\\bkill\\b", "(foo|bar)+", "(ab|ac)+", "[a-z]+(bar)*"])
+def test_ordinary_patterns_are_accepted(pattern):
+    bot.validate_pattern(pattern)
+
+
+def test_accepted_patterns_stay_fast_on_crafted_comments():
+    rules = bot.ModerationRules({"hide": {"patterns": ["(foo|bar)+$", "(ab|ac)+$", "x(a|b)*y"]}})
+    started = time.perf_counter()
+    # Instagram comments are at most 2200 characters long.
+    for text in ("foo" * 733 + "!", "ab" * 1100 + "!", "x" + "ab" * 1099 + "!"):
+        assert rules.check({"username": "viewer", "text": text}) is None
+    assert time.perf_counter() - started < 0.5
+
+
+@pytest.mark.parametrize("data", [
+    ["spam"],
+    {"hide": ["spam"]},
+    {"hide": {"keywords": "spam"}},
+    {"hide": {"keywords": [1]}},
+    {"hide": {"phrases": ["spam"]}},
+    {"ban": {"keywords": ["spam"]}},
+])
+def test_malformed_rules_are_refused(data):
+    with pytest.raises(ValueError):
+        bot.ModerationRules(data)
+
+
+def test_reload_keeps_the_previous_rules_and_picks_up_a_fixed_file(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"hide": {"keywords": ["spam"]}}))
+    moderator = bot.Moderator(str(path))
+    comment = {"username": "viewer", "text": "spam here"}
+
+    async def run():
+        await moderator.reload()
+        assert moderator.check(comment) == ("hide", 'keyword "spam"')
+        path.write_text(json.dumps({"hide": ["spam"]}))
+        os.utime(path, (1, 1))
+        await moderator.reload()
+        assert moderator.check(comment) == ("hide", 'keyword "spam"')
+        path.write_text(json.dumps({"mute": {"keywords": ["spam"]}}))
+        os.utime(path, (2, 2))
+        await moderator.reload()
+        assert moderator.check(comment) == ("mute", 'keyword "spam"')
+
+    asyncio.run(run())
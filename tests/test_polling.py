@@ -0,0 +1,70 @@
+import asyncio
+
+import bot
+
+
+class FakeLive:
+    broadcast_id = 1
+    last_error = None
+
+    def __init__(self):
+        self.viewers_failed = asyncio.Event()
+        self.comments = [{"pk": 1, "username": "viewer", "text": "hello", "created_at": 100}]
+
+    async def live_info(self):
+        return {}
+
+    async def get_viewer_list(self):
+        await asyncio.sleep(0)
+        self.viewers_failed.set()
+        # The shared field one poll used to read another's failure from.
+        self.last_error = ConnectionError("viewer list failed")
+        raise self.last_error
+
+    async def get_comments(self, last_comment_ts=None):
+        self.last_error = None
+        # Runs behind the failing viewer poll, like on the user's executor lock.
+        await self.viewers_failed.wait()
+        return [c for c in self.comments if c["created_at"] > last_comment_ts]
+
+
+def capture(monkeypatch):
+    sent = []
+    archived = []
+    monkeypatch.setattr(bot.sender, "send", lambda chat_id, text: sent.append(text))
+    monkeypatch.setattr(bot.archive, "append", lambda user_id, broadcast_id, comments: archived.extend(comments))
+    return sent, archived
+
+
+def test_failed_poll_does_not_drop_comments_of_another(monkeypatch):
+    sent, archived = capture(monkeypatch)
+
+    async def run():
+        monitor = bot.LiveMonitor(1, 1, FakeLive())
+        await asyncio.gather(monitor.jobs["viewers"].refresh(), monitor.jobs["comments"].refresh())
+        return monitor
+
+    monitor = asyncio.run(run())
+    assert [c["pk"] for c in archived] == [1]
+    assert any("hello" in text for text in sent)
+    assert monitor.comments.last_comment_ts == 100
+
+
+def test_comments_are_seen_only_once_delivered(monkeypatch):
+    sent, archived = capture(monkeypatch)
+    ig_live = FakeLive()
+    ig_live.viewers_failed.set()
+
+    async def run():
+        poller = bot.CommentPoller(1, 1, ig_live)
+        first = await poller.poll()
+        # The result was dropped before delivery: the comment must come back.
+        second = await poller.poll()
+        await poller.deliver(second)
+        return first, second, await poller.poll()
+
+    first, second, third = asyncio.run(run())
+    assert [c["pk"] for c in first] == [1]
+    assert [c["pk"] for c in second] == [1]
+    assert third == []
+    assert [c["pk"] for c in archived] == [1]
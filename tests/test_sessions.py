@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+import bot
+
+
+class FakeClient:
+    user_id = 42
+    username = "account"
+
+    def user_info_v1(self, user_id):
+        return {}
+
+
+@pytest.fixture
+def deleted(monkeypatch):
+    deleted = []
+    monkeypatch.setattr(bot, "new_client", lambda settings=None: FakeClient())
+    monkeypatch.setattr(bot.session_store, "delete", deleted.append)
+    monkeypatch.setattr(bot.session_store, "mark_verified", lambda username: None)
+    return deleted
+
+
+def login_with(monkeypatch, error):
+    async def refuse(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(bot.governor, "run", refuse)
+    # Due for verification, like every client rehydrated from parking.
+    return bot.login_instagram(1, "account", session=({}, 0.0))
+
+
+@pytest.mark.parametrize("error", [bot.BudgetExceeded("over budget"), bot.CircuitOpenError("open"), TimeoutError()])
+def test_refused_verification_keeps_the_session(monkeypatch, deleted, error):
+    with pytest.raises(type(error)):
+        asyncio.run(login_with(monkeypatch, error))
+    assert deleted == []
+
+
+def test_rejected_session_is_deleted(monkeypatch, deleted):
+    with pytest.raises(ValueError, match="No password"):
+        asyncio.run(login_with(monkeypatch, bot.ig_errors.LoginRequired("login_required")))
+    assert deleted == ["account"]
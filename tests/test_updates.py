@@ -0,0 +1,39 @@
+import asyncio
+from types import SimpleNamespace
+
+import bot
+
+
+def update(user_id):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id))
+
+
+def test_queued_updates_of_one_user_do_not_block_another():
+    async def run():
+        processor = bot.PerUserUpdateProcessor(2)
+        release = asyncio.Event()
+        order = []
+
+        async def handle(name, wait=False):
+            order.append(f"{name} start")
+            if wait:
+                await release.wait()
+            order.append(f"{name} end")
+
+        busy = [
+            asyncio.ensure_future(processor.process_update(update(1), handle(f"a{i}", wait=True)))
+            for i in range(3)
+        ]
+        await asyncio.sleep(0.01)
+        # User 1 has one update running and two queued; user 2 still gets a slot.
+        await asyncio.wait_for(processor.process_update(update(2), handle("b")), 1)
+        release.set()
+        await asyncio.gather(*busy)
+        return order
+
+    order = asyncio.run(run())
+    assert order.index("b end") < order.index("a0 end")
+    # One user's updates still run one at a time, in order.
+    assert [step for step in order if step.startswith("a")] == [
+        "a0 start", "a0 end", "a1 start", "a1 end", "a2 start", "a2 end",
+    ]